@@ -0,0 +1,19 @@
+"""
+ASGI config for crm project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI, /graphql is served by crm.views.AsyncCrmGraphQLView
+(CRM_GRAPHQL_ASYNC).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
+os.environ.setdefault('CRM_GRAPHQL_ASYNC', '1')
+
+application = get_asgi_application()
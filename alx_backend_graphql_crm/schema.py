@@ -8,24 +8,18 @@ from graphene import ObjectType, String, Int, Field, List, Schema, Mutation, Inp
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError, transaction
 from django.utils import timezone
+from collections import Counter
 import graphene
 import re
+import uuid
 
-from crm.models import Customer, Product, Order
-from graphene_django import DjangoObjectType
+from crm import stats
+from crm.loaders import get_loaders
+from crm.models import PHONE_RE, Customer, Product, Order, OrderItem
 
 # === GraphQL Types ===
-class CustomerType(DjangoObjectType):
-    class Meta:
-        model = Customer
-
-class ProductType(DjangoObjectType):
-    class Meta:
-        model = Product
-
-class OrderType(DjangoObjectType):
-    class Meta:
-        model = Order
+# Shared with crm.schema so both halves of the API resolve relations through crm.loaders.
+from crm.schema import CustomerType, ProductType, OrderType
 
 # === Input Types ===
 class CreateCustomerInput(InputObjectType):
@@ -45,6 +39,36 @@ class CreateOrderInput(InputObjectType):
 
 # === Mutations ===
 
+BULK_CREATE_BATCH_SIZE = 1000
+
+
+def customer_from_input(data):
+    first_name, _, last_name = data.name.strip().partition(" ")
+    return Customer(
+        first_name=first_name,
+        last_name=last_name.strip(),
+        email=data.email,
+        phone_number=data.phone,
+    )
+
+
+def existing_emails(emails, chunk_size=BULK_CREATE_BATCH_SIZE):
+    emails = list(emails)
+    found = set()
+    for start in range(0, len(emails), chunk_size):
+        found.update(
+            Customer.objects.filter(email__in=emails[start:start + chunk_size])
+            .values_list("email", flat=True)
+        )
+    return found
+
+
+def integrity_error_message(customer, error):
+    if Customer.objects.filter(email=customer.email).exists():
+        return str(ValidationError("Email already exists."))
+    return str(error)
+
+
 class CreateCustomer(Mutation):
     class Arguments:
         input = CreateCustomerInput(required=True)
@@ -53,17 +77,14 @@ class CreateCustomer(Mutation):
     message = String()
 
     def mutate(root, info, input):
-        if input.phone and not re.match(r'^(\+?\d{10,15}|(\d{3}-\d{3}-\d{4}))$', input.phone):
+        if input.phone and not PHONE_RE.match(input.phone):
             raise graphene.GraphQLError("Invalid phone format.")
 
         if Customer.objects.filter(email=input.email).exists():
             raise graphene.GraphQLError("Email already exists.")
 
-        customer = Customer.objects.create(
-            name=input.name,
-            email=input.email,
-            phone=input.phone
-        )
+        customer = customer_from_input(input)
+        customer.save()
         return CreateCustomer(customer=customer, message="Customer created successfully.")
 
 class BulkCreateCustomers(Mutation):
@@ -74,25 +95,53 @@ class BulkCreateCustomers(Mutation):
     errors = List(String)
 
     def mutate(root, info, input):
-        created = []
         errors = []
+        pending = []
 
+        # One lookup for every email in the batch instead of an exists() per entry.
+        taken = existing_emails({data.email for data in input})
         for i, data in enumerate(input):
             try:
-                if data.phone and not re.match(r'^(\+?\d{10,15}|(\d{3}-\d{3}-\d{4}))$', data.phone):
+                if data.phone and not PHONE_RE.match(data.phone):
                     raise ValidationError("Invalid phone format.")
 
-                if Customer.objects.filter(email=data.email).exists():
+                if data.email in taken:
                     raise ValidationError("Email already exists.")
 
-                customer = Customer(name=data.name, email=data.email, phone=data.phone)
-                customer.full_clean()
-                customer.save()
-                created.append(customer)
+                customer = customer_from_input(data)
+                # Uniqueness is settled by the lookup above and the batch-local set.
+                customer.full_clean(validate_unique=False)
+                taken.add(data.email)
+                pending.append((i, customer))
             except Exception as e:
-                errors.append(f"Entry {i}: {str(e)}")
+                errors.append((i, str(e)))
 
-        return BulkCreateCustomers(customers=created, errors=errors)
+        created = []
+        # One transaction for the whole batch: the valid entries are committed
+        # together or, on an unexpected error, not at all. Each chunk is a
+        # savepoint, so a chunk that hits a constraint can be retried row by row
+        # without undoing the others.
+        with transaction.atomic():
+            for start in range(0, len(pending), BULK_CREATE_BATCH_SIZE):
+                chunk = pending[start:start + BULK_CREATE_BATCH_SIZE]
+                try:
+                    with transaction.atomic():
+                        stats.bulk_create([customer for _, customer in chunk])
+                    created.extend(customer for _, customer in chunk)
+                except IntegrityError:
+                    # Usually a concurrent writer took one of the emails; retry row
+                    # by row so only the conflicting entries are reported.
+                    for i, customer in chunk:
+                        try:
+                            with transaction.atomic():
+                                stats.bulk_create([customer])
+                            created.append(customer)
+                        except IntegrityError as e:
+                            errors.append((i, integrity_error_message(customer, e)))
+        return BulkCreateCustomers(
+            customers=get_loaders(info).register(created),
+            errors=[f"Entry {i}: {message}" for i, message in sorted(errors)],
+        )
 
 class CreateProduct(Mutation):
     class Arguments:
@@ -113,6 +162,10 @@ class CreateProduct(Mutation):
         )
         return CreateProduct(product=product)
 
+def new_order_number():
+    return f"ORD-{uuid.uuid4().hex[:16].upper()}"
+
+
 class CreateOrder(Mutation):
     class Arguments:
         input = CreateOrderInput(required=True)
@@ -123,22 +176,31 @@ class CreateOrder(Mutation):
         if not input.product_ids:
             raise graphene.GraphQLError("At least one product must be selected.")
 
-        try:
-            customer = Customer.objects.get(pk=input.customer_id)
-        except Customer.DoesNotExist:
+        customer_id = Customer.objects.filter(pk=input.customer_id).values_list("pk", flat=True).first()
+        if customer_id is None:
             raise graphene.GraphQLError("Invalid customer ID.")
 
-        products = Product.objects.filter(pk__in=input.product_ids)
-        if products.count() != len(input.product_ids):
+        # A product listed more than once is ordered in that quantity.
+        quantities = Counter(str(pk) for pk in input.product_ids)
+        products = Product.objects.in_bulk(list(quantities))
+        if len(products) != len(quantities):
             raise graphene.GraphQLError("One or more product IDs are invalid.")
 
-        total_amount = sum(product.price for product in products)
-        order = Order.objects.create(
-            customer=customer,
-            total_amount=total_amount,
-            order_date=input.order_date or timezone.now()
-        )
-        order.products.set(products)
+        with transaction.atomic():
+            order = Order(customer_id=customer_id, order_number=new_order_number())
+            if input.order_date:
+                order.created_at = input.order_date
+            order.save()
+            stats.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_name=product.name,
+                    quantity=quantities[str(pk)],
+                    price=product.price,
+                    created_at=order.created_at,
+                )
+                for pk, product in products.items()
+            ])
         return CreateOrder(order=order)
 
 # === Query and Mutation Entry Point ===
@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_delete
 
 
 class CrmConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "crm"
+
+    def ready(self):
+        from . import response_cache, stats
+        from .models import Customer, Order, OrderItem, Product
+
+        # Keep the CrmStats rollup in step with every save/delete.
+        post_save.connect(stats.customer_saved, sender=Customer, dispatch_uid="crm_stats_customer_saved")
+        post_delete.connect(stats.customer_deleted, sender=Customer, dispatch_uid="crm_stats_customer_deleted")
+        post_save.connect(stats.order_saved, sender=Order, dispatch_uid="crm_stats_order_saved")
+        post_delete.connect(stats.order_deleted, sender=Order, dispatch_uid="crm_stats_order_deleted")
+        post_save.connect(stats.order_item_saved, sender=OrderItem, dispatch_uid="crm_stats_order_item_saved")
+        pre_delete.connect(stats.order_item_pre_delete, sender=OrderItem, dispatch_uid="crm_stats_order_item_pre_delete")
+        post_delete.connect(stats.order_item_deleted, sender=OrderItem, dispatch_uid="crm_stats_order_item_deleted")
+
+        # Invalidate cached report fields that read the changed model.
+        for model in (Customer, Order, OrderItem, Product):
+            name = model._meta.model_name
+            post_save.connect(response_cache.model_changed, sender=model, dispatch_uid=f"crm_cache_{name}_saved")
+            post_delete.connect(response_cache.model_changed, sender=model, dispatch_uid=f"crm_cache_{name}_deleted")
@@ -0,0 +1,161 @@
+"""
+GraphQL benchmark workload and budgets.
+
+Each operation is executed against graphql_crm.schema.schema with SQL capture
+on. Query counts must not grow with the dataset (that is how an N+1 shows up),
+so every operation has a fixed query budget; latency budgets are per dataset
+size. Both live in benchmark_budgets.json next to this module and are checked
+by ``manage.py benchmark_graphql`` and by the test suite.
+
+Mutations run inside a transaction that is rolled back after every iteration,
+so repeated runs see the same data and a seeded dataset can be reused. The
+response cache is off while measuring, so cached report fields are timed and
+counted on their queries rather than on cache hits.
+"""
+import json
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .models import Customer, Product
+
+BUDGETS_PATH = Path(__file__).with_name('benchmark_budgets.json')
+
+# Dataset sizes in rows (customers + orders + items). The seed uses a fixed
+# shape of 3 orders per customer and 2 items per order, i.e. 10 rows per customer.
+ROWS_PER_CUSTOMER = 10
+SIZES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+ORDER_FIELDS = "orderNumber status createdAt customer { email } items { productName quantity price }"
+
+OPERATIONS = {
+    'totalCustomers': ("{ totalCustomers }", None),
+    'totalOrders': ("{ totalOrders }", None),
+    'totalRevenue': ("{ totalRevenue }", None),
+    'totalRevenueByStatus': ('{ totalRevenue(status: "completed") }', None),
+    'customers': (
+        "{ customers(first: 50) { edges { node { email isActive orderCount lastOrderDate } } "
+        "pageInfo { endCursor hasNextPage } } }",
+        None,
+    ),
+    'customersWithOrders': (
+        "{ customers(first: 50) { edges { node { email orders { %s } } } } }" % ORDER_FIELDS,
+        None,
+    ),
+    'orders': (
+        "{ orders(first: 50) { edges { node { %s } } pageInfo { endCursor hasNextPage } } }" % ORDER_FIELDS,
+        None,
+    ),
+    'searchCustomers': ('{ searchCustomers(query: "jo", first: 10) { email firstName lastName } }', None),
+    'products': ("{ products(first: 50) { edges { node { name stock } } } }", None),
+    'updateLowStockProducts': (
+        "mutation { updateLowStockProducts(threshold: 1) { message updatedProducts { name stock } } }",
+        None,
+    ),
+    'createCustomer': (
+        "mutation($input: CreateCustomerInput!) { createCustomer(input: $input) { customer { id email } } }",
+        lambda: {'input': {'name': 'Bench Mark', 'email': 'bench.mark@example.com', 'phone': '+12345678901'}},
+    ),
+    'bulkCreateCustomers': (
+        "mutation($input: [CreateCustomerInput]!) { bulkCreateCustomers(input: $input) "
+        "{ customers { id email } errors } }",
+        lambda: {'input': [
+            {'name': f'Bench Mark{n}', 'email': f'bench.mark{n}@example.com'} for n in range(50)
+        ]},
+    ),
+    'createOrder': (
+        "mutation($input: CreateOrderInput!) { createOrder(input: $input) "
+        "{ order { orderNumber customer { email } items { productName quantity price } } } }",
+        lambda: {'input': {
+            'customerId': Customer.objects.values_list('pk', flat=True).first(),
+            'productIds': list(Product.objects.values_list('pk', flat=True)[:3]),
+        }},
+    ),
+}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Context:
+    """Stand-in for the request object GraphQLView passes as context."""
+
+
+@dataclass
+class Measurement:
+    name: str
+    queries: int
+    timings: list = field(default_factory=list)
+
+    def percentile(self, p):
+        if len(self.timings) == 1:
+            return self.timings[0]
+        return statistics.quantiles(self.timings, n=100, method='inclusive')[p - 1]
+
+    def summary(self):
+        return {
+            'queries': self.queries,
+            'p50_ms': round(self.percentile(50), 3),
+            'p95_ms': round(self.percentile(95), 3),
+            'p99_ms': round(self.percentile(99), 3),
+        }
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def execute(name):
+    """Run one operation once; return (result, queries executed, elapsed ms)."""
+    from graphql_crm.schema import schema
+
+    query, variables = OPERATIONS[name]
+    is_mutation = query.lstrip().startswith('mutation')
+    variables = variables() if variables else None
+    # CaptureQueriesContext counts by the length of the (bounded) query log,
+    # which stops growing once full, e.g. after seeding a large dataset.
+    reset_queries()
+    with override_settings(CRM_RESPONSE_CACHE=None), transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = schema.execute(query, variable_values=variables, context_value=Context())
+            elapsed = (time.perf_counter() - start) * 1000
+        if is_mutation:
+            transaction.set_rollback(True)
+    if result.errors:
+        raise BenchmarkError(f"{name}: {result.errors[0].message}")
+    return result, len(queries), elapsed
+
+
+def measure(name, repeat=20, warmup=2):
+    for _ in range(warmup):
+        execute(name)
+    measurement = Measurement(name=name, queries=0)
+    for _ in range(repeat):
+        _result, queries, elapsed = execute(name)
+        # The worst run counts, e.g. one that first loads a lazily built rollup.
+        measurement.queries = max(measurement.queries, queries)
+        measurement.timings.append(elapsed)
+    return measurement
+
+
+def check(measurement, budgets, size=None):
+    """Return the budget violations of one measurement as messages."""
+    budget = budgets.get(measurement.name)
+    if budget is None:
+        return [f"{measurement.name}: no budget committed"]
+    failures = []
+    if measurement.queries > budget['queries']:
+        failures.append(f"{measurement.name}: {measurement.queries} queries > budget {budget['queries']}")
+    p95_budget = budget.get('p95_ms', {}).get(size) if size else None
+    if p95_budget is not None:
+        p95 = measurement.percentile(95)
+        if p95 > p95_budget:
+            failures.append(f"{measurement.name}: p95 {p95:.1f} ms > budget {p95_budget} ms at {size}")
+    return failures
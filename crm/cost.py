@@ -0,0 +1,209 @@
+"""
+Static query cost and depth analysis, run before execution.
+
+Every field that returns an object costs one unit per time it is resolved;
+scalars are free except at the root, where they cost one unit. A field's
+children are resolved once per item it returns: a connection counts as many
+items as its ``first``/``last`` argument (or RELAY_CONNECTION_MAX_LIMIT when
+neither is given), a list field with a ``first`` argument (searchCustomers)
+as many as that, and any other list as CRM_GRAPHQL_DEFAULT_LIST_SIZE. The
+``edges`` list of a connection is already covered by the connection's page
+size. So
+
+    customers(first: 50) { edges { node { orders { items { productName } } } } }
+
+costs 1 (customers) + 1 (edges) + 50 (node) + 50 (orders) + 500 (items).
+
+Operations deeper than CRM_GRAPHQL_MAX_DEPTH or costlier than
+CRM_GRAPHQL_MAX_COST are rejected. CRM_GRAPHQL_COST_PER_MINUTE, when set, is
+a per-client budget of cost units per minute (fixed window, kept in Django's
+cache); operations beyond it are throttled. Introspection fields are not
+counted.
+"""
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    InlineFragmentNode,
+    OperationType,
+    get_named_type,
+    get_nullable_type,
+    is_composite_type,
+)
+from graphql.execution.values import get_argument_values
+
+THROTTLE_PREFIX = 'crm:cost:'
+
+
+def max_depth():
+    return getattr(settings, 'CRM_GRAPHQL_MAX_DEPTH', 8)
+
+
+def max_cost():
+    return getattr(settings, 'CRM_GRAPHQL_MAX_COST', 5000)
+
+
+def default_list_size():
+    return getattr(settings, 'CRM_GRAPHQL_DEFAULT_LIST_SIZE', 10)
+
+
+def cost_per_minute():
+    return getattr(settings, 'CRM_GRAPHQL_COST_PER_MINUTE', None)
+
+
+class QueryCostError(GraphQLError):
+    def __init__(self, message, code, report):
+        super().__init__(message, extensions={'code': code, 'cost': report})
+
+
+@dataclass
+class Cost:
+    cost: int = 0
+    depth: int = 0
+
+    def report(self, remaining=None):
+        report = {
+            'requested': self.cost,
+            'depth': self.depth,
+            'maxCost': max_cost(),
+            'maxDepth': max_depth(),
+        }
+        if remaining is not None:
+            report['remainingPerMinute'] = remaining
+        return report
+
+
+def _is_connection(graphql_type):
+    return 'edges' in getattr(graphql_type, 'fields', {}) and 'pageInfo' in graphql_type.fields
+
+
+class Analyzer:
+    def __init__(self, schema, document, variables):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if definition.kind == 'fragment_definition'
+        }
+        self.result = Cost()
+
+    def fields(self, parent_type, selection_set, visited=()):
+        """Yield (parent type, FieldNode) for a selection set, expanding fragments."""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+                yield from self.fields(fragment_type, selection.selection_set, visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                yield from self.fields(fragment_type, fragment.selection_set, (*visited, name))
+
+    def page_size(self, field_def, node):
+        try:
+            args = get_argument_values(field_def, node, self.variables)
+        except GraphQLError:
+            # Invalid variables are reported by execution.
+            args = {}
+        size = args.get('first')
+        if size is None:
+            size = args.get('last')
+        return size if size is not None else graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+    def visit(self, parent_type, selection_set, multiplier, depth, page_size=None):
+        self.result.depth = max(self.result.depth, depth)
+        for field_parent, node in self.fields(parent_type, selection_set):
+            name = node.name.value
+            if name.startswith('__'):
+                continue
+            field_def = getattr(field_parent, 'fields', {}).get(name)
+            if field_def is None:
+                continue
+            field_type = get_nullable_type(field_def.type)
+            named = get_named_type(field_type)
+            if not is_composite_type(named) or node.selection_set is None:
+                self.result.depth = max(self.result.depth, depth + 1)
+                if depth == 0:
+                    self.result.cost += 1
+                continue
+            self.result.cost += multiplier
+            if _is_connection(named):
+                # The page size multiplies below the connection's edges.
+                self.visit(named, node.selection_set, multiplier, depth + 1, self.page_size(field_def, node))
+                continue
+            if isinstance(field_type, GraphQLList):
+                if page_size is not None:
+                    items = page_size
+                elif 'first' in field_def.args:
+                    items = self.page_size(field_def, node)
+                else:
+                    items = default_list_size()
+            else:
+                items = 1
+            self.visit(named, node.selection_set, multiplier * items, depth + 1)
+
+
+def analyze(schema, operation, document, variables=None):
+    """Return the Cost of one operation of a validated document."""
+    root_type = {
+        OperationType.QUERY: schema.query_type,
+        OperationType.MUTATION: schema.mutation_type,
+        OperationType.SUBSCRIPTION: schema.subscription_type,
+    }[operation.operation]
+    analyzer = Analyzer(schema, document, variables)
+    analyzer.visit(root_type, operation.selection_set, 1, 0)
+    return analyzer.result
+
+
+def charge(client, amount):
+    """Spend cost units from a client's per-minute budget; return what is left, or None if unlimited."""
+    limit = cost_per_minute()
+    if not limit:
+        return None
+    key = f"{THROTTLE_PREFIX}{client}:{int(time.time() // 60)}"
+    cache.add(key, 0, 120)
+    try:
+        spent = cache.incr(key, amount)
+    except ValueError:
+        # The window expired between add() and incr().
+        cache.set(key, amount, 120)
+        spent = amount
+    return limit - spent
+
+
+def admit(schema, operation, document, variables, client):
+    """
+    Check an operation against the depth, cost and rate limits.
+
+    Returns the cost report for the response extensions, or raises
+    QueryCostError with the report attached.
+    """
+    cost = analyze(schema, operation, document, variables)
+    if cost.depth > max_depth():
+        raise QueryCostError(
+            f"Query depth {cost.depth} exceeds the maximum of {max_depth()}.", 'QUERY_TOO_DEEP', cost.report()
+        )
+    if cost.cost > max_cost():
+        raise QueryCostError(
+            f"Query cost {cost.cost} exceeds the maximum of {max_cost()}.", 'QUERY_TOO_COSTLY', cost.report()
+        )
+    remaining = charge(client, cost.cost)
+    if remaining is not None and remaining < 0:
+        raise QueryCostError(
+            f"Query cost budget of {cost_per_minute()} per minute exhausted; retry in the next minute.",
+            'RATE_LIMITED', cost.report(remaining=0),
+        )
+    return cost.report(remaining=remaining)
@@ -1,9 +1,7 @@
 import datetime
-from itertools import product
 import sys
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport, post
 
+from crm import graphql_client, reminders
 
 
 def log_crm_heartbeat():
@@ -17,27 +15,17 @@ def log_crm_heartbeat():
 
     # Optional: Check GraphQL hello query
     try:
-        response = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=False,
-            retries=3,
-        ).execute(gql("{ hello }"))
+        response = graphql_client.execute_query("{ hello }")
         if response:
             print("GraphQL endpoint is responsive.")
     except Exception as e:
-        response = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=False,
-            retries=3,
-        ).execute(gql("{ hello }"))
         print(f"Error checking GraphQL endpoint: {e}")
         sys.exit(1)
-        
+
     print("CRM heartbeat logged successfully.")
 
 
 def update_low_stock():
-    url = "http://localhost:8000/graphql/"
     query = '''
     mutation {
         updateLowStockProducts {
@@ -52,26 +40,22 @@ def update_low_stock():
     '''
 
     try:
-        # response = requests.post(url, json={'query': query})
-        transport = RequestsHTTPTransport(
-            url=url,
-            use_json=True,
-            verify=False,
-            retries=3,
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        response = client.execute(gql(query))
-        data = response
-        if "errors" in data:
-            log_msg = f"{datetime.now()} - GraphQL Error: {data['errors']}\n"
-        else:
-            result = data['data']['updateLowStockProducts']
-            log_msg = f"{datetime.now()} - {result['message']}\n"
-            for p in result['updatedProducts']:
-                log_msg += f" - {p['name']} updated to stock: {p['stock']}\n"
+        result = graphql_client.execute_query(query)['updateLowStockProducts']
+        log_msg = f"{datetime.datetime.now()} - {result['message']}\n"
+        for p in result['updatedProducts']:
+            log_msg += f" - {p['name']} updated to stock: {p['stock']}\n"
 
     except Exception as e:
-        log_msg = f"{datetime.now()} - Exception occurred: {e}\n"
+        log_msg = f"{datetime.datetime.now()} - Exception occurred: {e}\n"
 
     with open("/tmp/low_stock_updates_log.txt", "a") as log_file:
         log_file.write(log_msg)
+
+
+def send_order_reminders():
+    result = reminders.dispatch()
+    timestamp = datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
+    with open("/tmp/order_reminders_log.txt", "a") as log_file:
+        log_file.write(
+            f"{timestamp} Reminders sent: {result.sent}, already sent: {result.skipped}, failed: {result.failed}\n"
+        )
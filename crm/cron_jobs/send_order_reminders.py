@@ -1,50 +1,32 @@
 #!/usr/bin/env python
 
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-from datetime import datetime, timedelta
+import os
 import sys
+from datetime import datetime
+from pathlib import Path
 
-# Set up GraphQL client
-transport = RequestsHTTPTransport(
-    url="http://localhost:8000/graphql",
-    verify=False,
-    retries=3,
-)
-client = Client(transport=transport, fetch_schema_from_transport=False)
-
-# Define date range
-end_date = datetime.now()
-start_date = end_date - timedelta(days=7)
-
-# Format dates in ISO 8601
-start = start_date.isoformat()
-end = end_date.isoformat()
-
-# Define query (ensure your schema supports filtering by order_date)
-query = gql("""
-query GetRecentOrders($start: DateTime!, $end: DateTime!) {
-  orders(orderDate_Gte: $start, orderDate_Lte: $end) {
-    id
-    customer {
-      email
-    }
-  }
-}
-""")
-
-# Run query
+# Run inside the Django project, so queries execute in-process (crm.graphql_client).
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+import django
+
+django.setup()
+
+from crm import reminders
+
+# Send reminders for the past week's orders; a rerun skips customers already reminded today.
 try:
-    response = client.execute(query, variable_values={"start": start, "end": end})
-    orders = response.get("orders", [])
+    result = reminders.dispatch()
 except Exception as e:
     print(f"Error fetching orders: {e}")
     sys.exit(1)
 
-# Log orders
+# Log the run
 timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
 with open("/tmp/order_reminders_log.txt", "a") as log_file:
-    for order in orders:
-        log_file.write(f"{timestamp} Order ID: {order['id']}, Email: {order['customer']['email']}\n")
+    log_file.write(
+        f"{timestamp} Reminders sent: {result.sent}, already sent: {result.skipped}, failed: {result.failed}\n"
+    )
 
 print("Order reminders processed!")
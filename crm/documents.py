@@ -0,0 +1,156 @@
+"""
+Parsed-document cache and persisted queries for the GraphQL endpoint.
+
+Parsing and validating a query costs more than resolving most of the small
+queries the jobs send, and they send the same few strings all day. Documents
+that parsed and validated cleanly are kept in a bounded LRU keyed by the
+SHA-256 of the query text, so a repeated query goes straight to execution.
+
+Persisted queries (CRM_GRAPHQL_PERSISTED_QUERIES):
+
+``"apq"`` (default)
+    Automatic Persisted Queries: a client may send only
+    ``extensions.persistedQuery.sha256Hash``. An unknown hash answers with
+    ``PersistedQueryNotFound``; the client retries with the full query and the
+    hash, which registers it in Django's cache.
+``"strict"``
+    Only queries listed in the manifest (CRM_GRAPHQL_PERSISTED_QUERIES_MANIFEST,
+    a JSON object of hash -> query, maintained with
+    ``manage.py register_persisted_queries``) are executed, whether sent by
+    hash or in full. Nothing is registered at runtime.
+``"off"``
+    Hashes are ignored; only the document cache applies.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError
+
+CACHE_PREFIX = 'crm:apq:'
+DEFAULT_MANIFEST = Path(__file__).with_name('persisted_queries.json')
+MODES = ('off', 'apq', 'strict')
+
+
+def cache_size():
+    return getattr(settings, 'CRM_GRAPHQL_DOCUMENT_CACHE_SIZE', 256)
+
+
+def mode():
+    value = getattr(settings, 'CRM_GRAPHQL_PERSISTED_QUERIES', 'apq')
+    if value not in MODES:
+        raise ValueError(f"CRM_GRAPHQL_PERSISTED_QUERIES must be one of {', '.join(MODES)}, not {value!r}.")
+    return value
+
+
+def manifest_path():
+    return getattr(settings, 'CRM_GRAPHQL_PERSISTED_QUERIES_MANIFEST', DEFAULT_MANIFEST)
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class DocumentCache:
+    """Thread-safe bounded LRU of validated DocumentNodes."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._data.get(key)
+            if document is not None:
+                self._data.move_to_end(key)
+            return document
+
+    def put(self, key, document):
+        with self._lock:
+            self._data[key] = document
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+documents = DocumentCache(cache_size())
+
+
+class PersistedQueryError(GraphQLError):
+    def __init__(self, message, code):
+        super().__init__(message, extensions={'code': code})
+
+
+@lru_cache(maxsize=1)
+def _load_manifest(path, mtime):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def manifest():
+    path = str(manifest_path())
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return {}
+    # Reloaded whenever the file changes.
+    return _load_manifest(path, mtime)
+
+
+def extensions_of(request, data):
+    extensions = request.GET.get('extensions')
+    if extensions is None and isinstance(data, dict):
+        extensions = data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise PersistedQueryError("Extensions must be a JSON object.", 'BAD_REQUEST')
+    return extensions or {}
+
+
+def resolve_query(query, extensions):
+    """
+    Return (query text, hash) for a request, applying the persisted query mode.
+
+    Raises PersistedQueryError when a hash is unknown, does not match the
+    query, or (in strict mode) is not in the manifest.
+    """
+    current = mode()
+    persisted = extensions.get('persistedQuery') if current != 'off' else None
+    sha256 = persisted.get('sha256Hash') if isinstance(persisted, dict) else None
+
+    if current == 'strict':
+        sha256 = sha256 or (query_hash(query) if query else None)
+        registered = manifest().get(sha256) if sha256 else None
+        if registered is None:
+            raise PersistedQueryError("Query is not a registered persisted query.", 'PERSISTED_QUERY_NOT_ALLOWED')
+        if query and query != registered:
+            raise PersistedQueryError("Provided sha256Hash does not match query.", 'BAD_REQUEST')
+        return registered, sha256
+
+    if sha256 is None:
+        return query, query_hash(query) if query else None
+    if query:
+        if query_hash(query) != sha256:
+            raise PersistedQueryError("Provided sha256Hash does not match query.", 'BAD_REQUEST')
+        cache.set(CACHE_PREFIX + sha256, query, None)
+        return query, sha256
+    query = cache.get(CACHE_PREFIX + sha256)
+    if query is None:
+        raise PersistedQueryError("PersistedQueryNotFound", 'PERSISTED_QUERY_NOT_FOUND')
+    return query, sha256
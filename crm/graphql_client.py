@@ -0,0 +1,246 @@
+"""
+GraphQL client for the scheduled jobs (crm.cron, crm.tasks, crm/cron_jobs).
+
+The jobs live in this Django project, so they do not need the web server to
+run a query: LocalSchemaTransport executes the parsed document directly
+against the project schema (GRAPHENE['SCHEMA']) in the job's own process,
+with no HTTP round trip and no JSON encoding on either side. A job keeps
+working while the server is slow or restarting.
+
+CRM_GRAPHQL_JOB_TRANSPORT selects the transport:
+
+``"auto"`` (default)
+    In-process when the schema imports and the database is reachable,
+    otherwise HTTP to CRM_GRAPHQL_URL.
+``"local"``
+    In-process only.
+``"http"``
+    Always HTTP, for a job host that can only reach the API over the network.
+
+Each process keeps one connected session (session()) for all its calls.
+Over HTTP that is one keep-alive connection pool; calls time out after
+CRM_GRAPHQL_CLIENT_TIMEOUT seconds, and connection errors and 429/5xx
+answers are retried CRM_GRAPHQL_CLIENT_RETRIES times with exponential
+backoff (CRM_GRAPHQL_CLIENT_BACKOFF). The server schema, used to validate
+documents before sending them, is introspected once per schema version and
+cached on disk in CRM_GRAPHQL_SCHEMA_CACHE_DIR. The version is
+CRM_GRAPHQL_SCHEMA_VERSION, or a hash of the schema this code defines.
+
+There is no client-side batching: each job sends one operation per run
+(generate_crm_report reads crm.reports directly). /graphql accepts a JSON
+array of operations (see views.CrmGraphQLView) for clients that have several.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from gql import Client, gql
+from gql.transport import Transport
+from graphene_django.settings import graphene_settings
+from graphql import (
+    ExecutionResult,
+    build_client_schema,
+    execute,
+    get_introspection_query,
+    parse,
+    print_schema,
+    validate,
+)
+
+logger = logging.getLogger(__name__)
+
+MODES = ('auto', 'local', 'http')
+DEFAULT_SCHEMA_CACHE_DIR = Path(tempfile.gettempdir()) / 'crm-graphql-schema'
+
+
+def transport_mode():
+    value = getattr(settings, 'CRM_GRAPHQL_JOB_TRANSPORT', 'auto')
+    if value not in MODES:
+        raise ValueError(f"CRM_GRAPHQL_JOB_TRANSPORT must be one of {', '.join(MODES)}, not {value!r}.")
+    return value
+
+
+def graphql_url():
+    return getattr(settings, 'CRM_GRAPHQL_URL', 'http://localhost:8000/graphql')
+
+
+def timeout():
+    return getattr(settings, 'CRM_GRAPHQL_CLIENT_TIMEOUT', 10)
+
+
+def retries():
+    return getattr(settings, 'CRM_GRAPHQL_CLIENT_RETRIES', 3)
+
+
+def backoff():
+    return getattr(settings, 'CRM_GRAPHQL_CLIENT_BACKOFF', 0.5)
+
+
+def schema_cache_dir():
+    return getattr(settings, 'CRM_GRAPHQL_SCHEMA_CACHE_DIR', DEFAULT_SCHEMA_CACHE_DIR)
+
+
+class JobContext:
+    """The ``info.context`` of an in-process execution; the loaders attach to it."""
+
+    user = None
+
+
+class LocalSchemaTransport(Transport):
+    """gql transport that executes documents against a graphene schema in this process."""
+
+    def __init__(self, schema=None):
+        if schema is None:
+            schema = graphene_settings.SCHEMA
+        self.schema = schema.graphql_schema
+
+    def connect(self):
+        # Fail here, before any query runs, when the database cannot be used.
+        close_old_connections()
+        connection.ensure_connection()
+
+    def close(self):
+        close_old_connections()
+
+    def execute(self, document, variable_values=None, operation_name=None, **kwargs):
+        return self._execute(document, variable_values, operation_name, JobContext())
+
+    def _execute(self, document, variable_values, operation_name, context):
+        errors = validate(self.schema, document)
+        if not errors:
+            result = execute(
+                self.schema,
+                document,
+                context_value=context,
+                variable_values=variable_values,
+                operation_name=operation_name,
+            )
+            errors = result.errors
+        else:
+            result = ExecutionResult(data=None)
+        # Errors as the HTTP endpoint would send them, so gql reports both transports alike.
+        return ExecutionResult(
+            data=result.data,
+            errors=[error.formatted for error in errors] if errors else None,
+            extensions=result.extensions,
+        )
+
+
+def http_transport():
+    # Imported here: only the HTTP fallback needs gql's requests extra.
+    from gql.transport.requests import RequestsHTTPTransport
+
+    return RequestsHTTPTransport(
+        url=graphql_url(),
+        verify=False,
+        timeout=timeout(),
+        retries=retries(),
+        retry_backoff_factor=backoff(),
+    )
+
+
+def get_transport():
+    """Return the transport chosen by CRM_GRAPHQL_JOB_TRANSPORT, falling back to HTTP in ``auto`` mode."""
+    mode = transport_mode()
+    if mode == 'http':
+        return http_transport()
+    try:
+        transport = LocalSchemaTransport()
+        transport.connect()
+        return transport
+    except Exception as e:
+        if mode == 'local':
+            raise
+        logger.warning("In-process GraphQL unavailable (%s); using %s.", e, graphql_url())
+        return http_transport()
+
+
+def schema_version():
+    """The version the cached introspection is stored under, or None if it cannot be known."""
+    version = getattr(settings, 'CRM_GRAPHQL_SCHEMA_VERSION', None)
+    if version:
+        return version
+    try:
+        sdl = print_schema(graphene_settings.SCHEMA.graphql_schema)
+    except Exception:
+        return None
+    return hashlib.sha256(sdl.encode()).hexdigest()[:16]
+
+
+def remote_schema(transport):
+    """
+    The server's schema for client-side validation, introspected once per
+    schema version and then read from CRM_GRAPHQL_SCHEMA_CACHE_DIR.
+    """
+    version = schema_version()
+    if version is None:
+        return None
+    path = Path(schema_cache_dir()) / f"schema-{version}.json"
+    try:
+        introspection = json.loads(path.read_text())
+    except (OSError, ValueError):
+        result = transport.execute(parse(get_introspection_query()), timeout=timeout())
+        if result.errors:
+            logger.warning("Schema introspection failed: %s", result.errors)
+            return None
+        introspection = result.data
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write and rename, so a concurrent job never reads half a file.
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(introspection))
+        os.replace(tmp, path)
+    return build_client_schema(introspection)
+
+
+def get_client():
+    return Client(transport=get_transport(), fetch_schema_from_transport=False)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    """
+    The process's shared, connected client session: one transport (and, over
+    HTTP, one keep-alive connection pool) reused by every job call.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            client = get_client()
+            session = client.connect_sync()
+            if not isinstance(client.transport, LocalSchemaTransport):
+                # The local transport validates against the schema itself.
+                client.schema = remote_schema(client.transport)
+            atexit.register(client.close_sync)
+            _session = session
+        return _session
+
+
+def reset():
+    """Close the shared session; the next call opens a new one."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.client.close_sync()
+            atexit.unregister(_session.client.close_sync)
+            _session = None
+
+
+@lru_cache(maxsize=64)
+def document(query):
+    return gql(query)
+
+
+def execute_query(query, variables=None):
+    """Run one query or mutation and return its data; raises gql's TransportQueryError on GraphQL errors."""
+    return session().execute(document(query), variable_values=variables, timeout=timeout())
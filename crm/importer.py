@@ -0,0 +1,274 @@
+"""
+Streaming bulk import of customers, orders and order items.
+
+Rows flow through a generator pipeline (read -> batch -> validate/map ->
+bulk_create), so only one batch is in memory at a time. Foreign keys given as
+natural keys (customer email, order number) are resolved through bounded
+lookup caches that fetch all misses of a batch with one IN query. After every
+batch the ImportCheckpoint row is advanced in the same transaction as the
+insert, so a crashed import resumes after the last committed batch.
+
+Expected columns:
+    customers: first_name, last_name (or name), email, phone_number
+    orders:    order_number, customer_email, status, created_at
+    items:     order_number, product_name, quantity, price
+"""
+import csv
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import stats
+from .models import PHONE_RE, Customer, ImportCheckpoint, Order, OrderItem
+
+DEFAULT_BATCH_SIZE = 1000
+LOOKUP_CACHE_SIZE = 50000
+MAX_REPORTED_ERRORS = 100
+KINDS = ('customers', 'orders', 'items')
+
+
+class CrmImportError(Exception):
+    pass
+
+
+def read_rows(stream, fmt):
+    """
+    Yield one dict per data row of a CSV or JSON Lines text stream.
+
+    A JSON line that does not parse is yielded as its ValueError, so it is
+    reported as that row's error instead of ending the import.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield ValueError(f"Invalid JSON: {e}")
+    else:
+        raise CrmImportError(f"Unsupported format {fmt!r}; use 'csv' or 'jsonl'.")
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class LookupCache:
+    """Bounded LRU map of natural key -> row values, filled one IN query per batch."""
+
+    def __init__(self, queryset, key_field, value_fields, max_size=LOOKUP_CACHE_SIZE):
+        self.queryset = queryset
+        self.key_field = key_field
+        self.value_fields = value_fields
+        self.max_size = max_size
+        self._data = OrderedDict()
+
+    def resolve(self, keys):
+        keys = {key for key in keys if key}
+        missing = [key for key in keys if key not in self._data]
+        if missing:
+            rows = self.queryset.filter(**{f"{self.key_field}__in": missing}).values_list(
+                self.key_field, *self.value_fields
+            )
+            for key, *values in rows:
+                self._data[key] = tuple(values)
+        found = {}
+        for key in keys:
+            if key in self._data:
+                self._data.move_to_end(key)
+                found[key] = self._data[key]
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        return found
+
+    def add(self, key, values):
+        self._data[key] = values
+
+
+def _aware(value):
+    if value and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def _text(row, name):
+    value = row.get(name)
+    return value.strip() if isinstance(value, str) else value
+
+
+def _describe(exc):
+    if isinstance(exc, ValidationError) and hasattr(exc, 'error_dict'):
+        return "; ".join(f"{name}: {message}" for name, messages in exc.message_dict.items() for message in messages)
+    if isinstance(exc, ValidationError):
+        return "; ".join(exc.messages)
+    return str(exc)
+
+
+@dataclass
+class ImportResult:
+    kind: str
+    source: str
+    skipped: int = 0
+    processed: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def error(self, row_number, exc):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Row {row_number}: {_describe(exc)}")
+
+
+class Importer:
+    def __init__(self, kind, source, batch_size=DEFAULT_BATCH_SIZE, restart=False):
+        if kind not in KINDS:
+            raise CrmImportError(f"Unknown import kind {kind!r}; use one of {', '.join(KINDS)}.")
+        self.kind = kind
+        self.source = source
+        self.batch_size = batch_size
+        self.restart = restart
+        self.customers = LookupCache(Customer.objects.all(), 'email', ['id'])
+        self.orders = LookupCache(Order.objects.all(), 'order_number', ['id'])
+
+    def run(self, rows, progress=None):
+        checkpoint, _created = ImportCheckpoint.objects.get_or_create(source=self.source, kind=self.kind)
+        if self.restart:
+            checkpoint.rows_processed = checkpoint.rows_imported = checkpoint.rows_failed = 0
+            checkpoint.completed_at = None
+            checkpoint.save()
+        result = ImportResult(kind=self.kind, source=self.source, skipped=checkpoint.rows_processed)
+        # Rows before the checkpoint are read but never parsed into models.
+        rows = islice(rows, checkpoint.rows_processed, None)
+        row_number = checkpoint.rows_processed
+        build = getattr(self, f"build_{self.kind}")
+
+        for batch in batched(rows, self.batch_size):
+            numbered = []
+            for number, row in enumerate(batch, start=row_number + 1):
+                if isinstance(row, dict):
+                    numbered.append((number, row))
+                else:
+                    result.error(number, row if isinstance(row, ValueError) else ValidationError("Expected an object."))
+            row_number += len(batch)
+            objects = build(numbered, result)
+            with transaction.atomic():
+                self.insert(objects)
+                ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                    rows_processed=row_number,
+                    rows_imported=checkpoint.rows_imported + result.imported + len(objects),
+                    rows_failed=checkpoint.rows_failed + result.failed,
+                    updated_at=timezone.now(),
+                )
+            result.processed += len(batch)
+            result.imported += len(objects)
+            if progress:
+                progress(result)
+
+        ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(completed_at=timezone.now())
+        return result
+
+    # === Row mapping (one batch at a time, no per-row queries) ===
+
+    def build_customers(self, numbered, result):
+        taken = set(self.customers.resolve(_text(row, 'email') for _, row in numbered))
+        objects = []
+        for number, row in numbered:
+            try:
+                email = _text(row, 'email')
+                first_name, last_name = _text(row, 'first_name'), _text(row, 'last_name')
+                if not (first_name or last_name) and _text(row, 'name'):
+                    first_name, _, last_name = _text(row, 'name').partition(' ')
+                phone = _text(row, 'phone_number') or _text(row, 'phone') or None
+                if phone and not PHONE_RE.match(phone):
+                    raise ValidationError("Invalid phone format.")
+                if email in taken:
+                    raise ValidationError("Email already exists.")
+                customer = Customer(
+                    first_name=first_name or '', last_name=(last_name or '').strip(),
+                    email=email, phone_number=phone,
+                )
+                customer.full_clean(validate_unique=False)
+                taken.add(email)
+                objects.append(customer)
+            except (ValidationError, ValueError, TypeError) as e:
+                result.error(number, e)
+        return objects
+
+    def build_orders(self, numbered, result):
+        customers = self.customers.resolve(_text(row, 'customer_email') for _, row in numbered)
+        taken = set(self.orders.resolve(_text(row, 'order_number') for _, row in numbered))
+        objects = []
+        for number, row in numbered:
+            try:
+                order_number = _text(row, 'order_number')
+                customer = customers.get(_text(row, 'customer_email'))
+                if customer is None:
+                    raise ValidationError("Unknown customer email.")
+                if order_number in taken:
+                    raise ValidationError("Order number already exists.")
+                order = Order(
+                    customer_id=customer[0],
+                    order_number=order_number,
+                    status=_text(row, 'status') or 'active',
+                )
+                if _text(row, 'created_at'):
+                    order.created_at = _text(row, 'created_at')
+                order.full_clean(exclude=['customer'], validate_unique=False)
+                order.created_at = _aware(order.created_at)
+                taken.add(order_number)
+                objects.append(order)
+            except (ValidationError, ValueError, TypeError) as e:
+                result.error(number, e)
+        return objects
+
+    def build_items(self, numbered, result):
+        orders = self.orders.resolve(_text(row, 'order_number') for _, row in numbered)
+        objects = []
+        for number, row in numbered:
+            try:
+                order = orders.get(_text(row, 'order_number'))
+                if order is None:
+                    raise ValidationError("Unknown order number.")
+                item = OrderItem(
+                    order_id=order[0],
+                    product_name=_text(row, 'product_name'),
+                    quantity=_text(row, 'quantity') or 1,
+                    price=_text(row, 'price'),
+                )
+                item.full_clean(exclude=['order'], validate_unique=False)
+                if item.quantity <= 0:
+                    raise ValidationError("Quantity must be greater than zero.")
+                objects.append(item)
+            except (ValidationError, ValueError, TypeError) as e:
+                result.error(number, e)
+        return objects
+
+    # === Writes ===
+
+    def insert(self, objects):
+        if not objects:
+            return
+        stats.bulk_create(objects, batch_size=self.batch_size)
+        # Later batches resolve the new rows from the lookup caches.
+        if isinstance(objects[0], Customer):
+            for customer in objects:
+                self.customers.add(customer.email, (customer.pk,))
+        elif isinstance(objects[0], Order):
+            for order in objects:
+                self.orders.add(order.order_number, (order.pk,))
+
+
+def import_stream(kind, stream, fmt, source, batch_size=DEFAULT_BATCH_SIZE, restart=False, progress=None):
+    importer = Importer(kind, source, batch_size=batch_size, restart=restart)
+    return importer.run(read_rows(stream, fmt), progress=progress)
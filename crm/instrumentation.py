@@ -0,0 +1,171 @@
+"""
+Per-request resolver timing and SQL instrumentation for the GraphQL endpoint.
+
+CrmGraphQLView (crm.views) creates a Recorder for each request when
+CRM_GRAPHQL_INSTRUMENTATION is on, installs it as a database execute wrapper
+and adds ResolverInstrumentation to the graphene middleware. When the setting
+is off neither is installed, so resolvers run exactly as before.
+
+Every SQL statement is attributed to the resolver that was running when it was
+issued. Resolvers are aggregated by path with list indices removed
+(``orders.edges.node.customer``), so a list of 50 orders yields one entry with
+50 calls. Statements are also grouped by shape (the SQL text with its
+placeholders and ``IN`` lists collapsed); a shape issued more than
+CRM_GRAPHQL_N_PLUS_ONE_THRESHOLD times is reported as a likely N+1.
+
+The resolver path and the active recorder are context variables, so the
+attribution also holds under the async view, where resolvers run
+concurrently and their SQL runs in the ORM thread pool (crm.loaders.run
+installs the recorder there through capture_sql()).
+"""
+import contextlib
+import inspect
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DEBUG_HEADER = 'X-GraphQL-Debug'
+REQUEST_PATH = '<request>'
+
+_current_path = ContextVar('crm_graphql_path', default=REQUEST_PATH)
+_active_recorder = ContextVar('crm_graphql_recorder', default=None)
+
+_IN_LIST = re.compile(r'\((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def enabled():
+    return getattr(settings, 'CRM_GRAPHQL_INSTRUMENTATION', False)
+
+
+def n_plus_one_threshold():
+    return getattr(settings, 'CRM_GRAPHQL_N_PLUS_ONE_THRESHOLD', 5)
+
+
+def sql_shape(sql):
+    return _WHITESPACE.sub(' ', _IN_LIST.sub('(%s, ...)', sql)).strip()
+
+
+def path_key(path):
+    return '.'.join(str(key) for key in path.as_list() if not isinstance(key, int))
+
+
+@contextlib.contextmanager
+def recording(recorder):
+    """Record the SQL of this thread, and of ORM calls made from this context, into recorder."""
+    token = _active_recorder.set(recorder)
+    try:
+        with connection.execute_wrapper(recorder):
+            yield recorder
+    finally:
+        _active_recorder.reset(token)
+
+
+def capture_sql():
+    """In an ORM worker thread: record SQL into the recorder of the calling request, if any."""
+    recorder = _active_recorder.get()
+    if recorder is None:
+        return contextlib.nullcontext()
+    return connection.execute_wrapper(recorder)
+
+
+class Recorder:
+    """Collects resolver and SQL timings for one GraphQL request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.resolvers = defaultdict(lambda: {'calls': 0, 'time_ms': 0.0, 'queries': 0, 'sql_ms': 0.0})
+        self.shapes = defaultdict(Counter)
+        self.queries = 0
+        self.sql_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() for the duration of the request.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            path = _current_path.get()
+            shape = sql_shape(sql)
+            with self.lock:
+                entry = self.resolvers[path]
+                entry['queries'] += 1
+                entry['sql_ms'] += elapsed
+                self.queries += 1
+                self.sql_ms += elapsed
+                self.shapes[shape][path] += 1
+
+    def resolved(self, key, elapsed):
+        with self.lock:
+            entry = self.resolvers[key]
+            entry['calls'] += 1
+            entry['time_ms'] += elapsed
+
+    def n_plus_one(self, threshold=None):
+        threshold = n_plus_one_threshold() if threshold is None else threshold
+        suspects = []
+        for shape, paths in self.shapes.items():
+            count = sum(paths.values())
+            if count > threshold:
+                suspects.append({'sql': shape, 'count': count, 'paths': dict(paths)})
+        return sorted(suspects, key=lambda suspect: -suspect['count'])
+
+    def report(self):
+        resolvers = {
+            key: {**entry, 'time_ms': round(entry['time_ms'], 3), 'sql_ms': round(entry['sql_ms'], 3)}
+            for key, entry in self.resolvers.items()
+        }
+        return {
+            'time_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_ms, 3),
+            'resolvers': resolvers,
+            'n_plus_one': self.n_plus_one(),
+        }
+
+    def log(self, operation_name=None):
+        report = self.report()
+        level = logging.WARNING if report['n_plus_one'] else logging.INFO
+        logger.log(level, json.dumps({'event': 'graphql.request', 'operation': operation_name, **report}))
+
+
+class ResolverInstrumentation:
+    """Graphene middleware timing every resolver of an instrumented request."""
+
+    def resolve(self, next, root, info, **args):
+        recorder = getattr(info.context, 'crm_instrumentation', None)
+        if recorder is None:
+            return next(root, info, **args)
+        key = path_key(info.path)
+        token = _current_path.set(key)
+        start = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            recorder.resolved(key, (time.perf_counter() - start) * 1000)
+            raise
+        finally:
+            _current_path.reset(token)
+        if inspect.isawaitable(result):
+            return self.timed(recorder, key, start, result)
+        recorder.resolved(key, (time.perf_counter() - start) * 1000)
+        return result
+
+    async def timed(self, recorder, key, start, result):
+        token = _current_path.set(key)
+        try:
+            return await result
+        finally:
+            _current_path.reset(token)
+            recorder.resolved(key, (time.perf_counter() - start) * 1000)
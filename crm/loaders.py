@@ -0,0 +1,265 @@
+"""
+Per-request batch loaders for the CRM relationships.
+
+GraphQL resolves Order.customer, Customer.orders and Order.items once per
+parent object. The loaders here remember which objects were resolved together
+(their "siblings"), and the first time a relation is needed for one of them
+they fetch it for all of them with a single ``IN (...)`` query keyed by the
+foreign key. The fetched objects are registered as the next sibling batch, so
+each level of a nested selection costs one query regardless of list size.
+
+Resolvers call ``load(info, name, parent)``. Under the sync GraphQLView this
+returns the value directly; under the async view it returns an awaitable that
+runs the ORM work in a bounded thread pool (CRM_GRAPHQL_ORM_THREADS), so
+independent fields can query concurrently without one thread per request.
+Inside ``request_scope()`` a pool thread keeps its database connection for all
+of a request's resolvers and it is released once, when the request ends.
+"""
+import asyncio
+import contextvars
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import instrumentation
+from .models import Customer, Order, OrderItem
+
+
+class SiblingRegistry:
+    def __init__(self):
+        self._batches = {}
+
+    def register(self, instances):
+        instances = list(instances)
+        for instance in instances:
+            self._batches[id(instance)] = instances
+        return instances
+
+    def siblings(self, instance):
+        return self._batches.get(id(instance)) or [instance]
+
+
+class ForeignKeyLoader:
+    """Loads the object a forward foreign key points to (e.g. Order.customer)."""
+
+    def __init__(self, registry, queryset, attname):
+        self.registry = registry
+        self.queryset = queryset
+        self.attname = attname
+        self.cache = {}
+        # Under the async view siblings load from several pool threads at once;
+        # the first fetches the whole batch while the others wait for it.
+        self.lock = threading.Lock()
+
+    def load(self, parent):
+        key = getattr(parent, self.attname)
+        if key is None:
+            return None
+        with self.lock:
+            return self._load(parent, key)
+
+    def _load(self, parent, key):
+        if key not in self.cache:
+            keys = {getattr(sibling, self.attname) for sibling in self.registry.siblings(parent)}
+            keys = {k for k in keys if k is not None and k not in self.cache}
+            keys.add(key)
+            found = self.queryset.in_bulk(keys)
+            self.registry.register(found.values())
+            for k in keys:
+                self.cache[k] = found.get(k)
+        return self.cache[key]
+
+    def prime(self, instances):
+        for instance in instances:
+            self.cache.setdefault(instance.pk, instance)
+
+
+class ReverseLoader:
+    """Loads the objects pointing at a parent through a foreign key (e.g. Order.items)."""
+
+    def __init__(self, registry, queryset, fk_attname, back=None):
+        self.registry = registry
+        self.queryset = queryset
+        self.fk_attname = fk_attname
+        # The ForeignKeyLoader for the opposite direction; parents already in memory
+        # are fed to it so child -> parent lookups need no query at all.
+        self.back = back
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def load(self, parent):
+        with self.lock:
+            return self._load(parent)
+
+    def _load(self, parent):
+        if parent.pk not in self.cache:
+            siblings = self.registry.siblings(parent)
+            if self.back is not None:
+                self.back.prime(siblings)
+            keys = {sibling.pk for sibling in siblings}
+            keys = {k for k in keys if k not in self.cache}
+            keys.add(parent.pk)
+            rows = self.queryset.filter(**{f"{self.fk_attname}__in": keys})
+            grouped = defaultdict(list)
+            for row in self.registry.register(rows):
+                grouped[getattr(row, self.fk_attname)].append(row)
+            for k in keys:
+                self.cache[k] = grouped.get(k, [])
+        return self.cache[parent.pk]
+
+
+class Loaders:
+    def __init__(self):
+        self.registry = SiblingRegistry()
+        self.customer = ForeignKeyLoader(self.registry, Customer.objects.with_stats(), "customer_id")
+        self.order = ForeignKeyLoader(self.registry, Order.objects.all(), "order_id")
+        self.orders = ReverseLoader(self.registry, Order.objects.all(), "customer_id", back=self.customer)
+        self.items = ReverseLoader(self.registry, OrderItem.objects.all(), "order_id", back=self.order)
+
+    def register(self, instances):
+        return self.registry.register(instances)
+
+
+def get_loaders(info):
+    """Return the loaders for the current request, creating them on first use."""
+    context = info.context
+    if context is None:
+        return Loaders()
+    if isinstance(context, dict):
+        loaders = context.get("crm_loaders")
+    else:
+        loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        if isinstance(context, dict):
+            context["crm_loaders"] = loaders
+        else:
+            context.crm_loaders = loaders
+    return loaders
+
+
+def in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CRM_GRAPHQL_ORM_THREADS', 8),
+                thread_name_prefix='crm-orm',
+            )
+    return _executor
+
+
+_request = contextvars.ContextVar('crm_orm_request', default=None)
+_workers = threading.local()
+
+
+class _Worker:
+    """A pool thread's connections, held for one request at a time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.request = None
+        self.connections = []
+
+    def release(self, request):
+        # Called once the request is done. A worker busy elsewhere has moved
+        # on to another request, which now holds it.
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self.request is not request:
+                return
+            for conn in self.connections:
+                conn.inc_thread_sharing()
+                try:
+                    conn.close_if_unusable_or_obsolete()
+                finally:
+                    conn.dec_thread_sharing()
+            self.request, self.connections = None, []
+        finally:
+            self.lock.release()
+
+
+def _worker():
+    worker = getattr(_workers, 'worker', None)
+    if worker is None:
+        worker = _workers.worker = _Worker()
+    return worker
+
+
+def _release(workers):
+    for worker in workers:
+        worker.release(workers)
+
+
+@asynccontextmanager
+async def request_scope():
+    """Let pool threads keep their connection across one request's resolvers."""
+    workers = set()
+    token = _request.set(workers)
+    try:
+        yield
+    finally:
+        _request.reset(token)
+        if workers:
+            # Connections are checked and closed off the event loop.
+            await sync_to_async(_release, thread_sensitive=False, executor=executor())(workers)
+
+
+def _in_pool(func, *args, **kwargs):
+    request = _request.get()
+    worker = _worker()
+    with worker.lock:
+        if request is None or worker.request is not request:
+            # Pool threads live across requests; apply CONN_MAX_AGE the way
+            # request handling does, so a thread never reuses a stale or
+            # broken connection.
+            close_old_connections()
+            worker.request = request
+            if request is not None:
+                request.add(worker)
+        try:
+            with instrumentation.capture_sql():
+                return func(*args, **kwargs)
+        finally:
+            if request is None:
+                close_old_connections()
+            else:
+                worker.connections = connections.all(initialized_only=True)
+
+
+def run(func, *args, **kwargs):
+    """Call blocking ORM code directly, or as an awaitable when resolving asynchronously."""
+    if in_event_loop():
+        return sync_to_async(_in_pool, thread_sensitive=False, executor=executor())(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+def load(info, name, parent):
+    return run(getattr(get_loaders(info), name).load, parent)
+
+
+def then(value, callback):
+    """Apply callback to a loaded value, whether it is ready or still awaitable."""
+    if asyncio.iscoroutine(value):
+        async def chained():
+            return callback(await value)
+        return chained()
+    return callback(value)
@@ -0,0 +1,92 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crm import benchmarks
+from crm.models import Customer
+from crm.seeding import Distribution
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the GraphQL API on seeded datasets (10k/100k/1M rows): latency "
+        "percentiles and SQL query counts per operation, checked against the budgets "
+        "committed in crm/benchmark_budgets.json. Fails if any budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", action="append", choices=list(benchmarks.SIZES),
+                            help="Dataset size; repeat for several. Default 10k.")
+        parser.add_argument("--operation", action="append", choices=list(benchmarks.OPERATIONS),
+                            help="Only run this operation; repeat for several.")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per operation.")
+        parser.add_argument("--data-dir", default=tempfile.gettempdir(),
+                            help="Where the seeded benchmark databases are kept between runs.")
+        parser.add_argument("--rebuild", action="store_true", help="Reseed datasets even if they exist.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        budgets = benchmarks.load_budgets()
+        operations = options["operation"] or list(benchmarks.OPERATIONS)
+        report, failures = {}, []
+        original_name = connection.settings_dict["NAME"]
+        try:
+            for size in options["size"] or ["10k"]:
+                self.use_dataset(size, Path(options["data_dir"]), options["rebuild"])
+                report[size] = {}
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{size} rows"))
+                self.stdout.write(f"  {'operation':<24}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+                for name in operations:
+                    try:
+                        measurement = benchmarks.measure(name, repeat=options["repeat"])
+                    except benchmarks.BenchmarkError as e:
+                        raise CommandError(str(e))
+                    summary = measurement.summary()
+                    report[size][name] = summary
+                    problems = benchmarks.check(measurement, budgets, size)
+                    failures.extend(problems)
+                    line = (
+                        f"  {name:<24}{summary['queries']:>8}{summary['p50_ms']:>10.2f}"
+                        f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+                    )
+                    self.stdout.write(self.style.ERROR(line) if problems else line)
+        finally:
+            connection.close()
+            connection.settings_dict["NAME"] = original_name
+
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if failures:
+            raise CommandError("Benchmark budgets exceeded:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All operations within budget."))
+
+    def use_dataset(self, size, data_dir, rebuild):
+        """Point the default connection at the seeded database for this size."""
+        customers = benchmarks.SIZES[size] // benchmarks.ROWS_PER_CUSTOMER
+        path = data_dir / f"crm-benchmark-{size}.sqlite3"
+        connection.close()
+        if rebuild and path.exists():
+            path.unlink()
+        connection.settings_dict["NAME"] = str(path)
+        call_command("migrate", verbosity=0, interactive=False)
+        if Customer.objects.count() == customers:
+            return
+        self.stdout.write(f"Seeding {size} dataset into {path}...")
+        connection.close()
+        path.unlink()
+        connection.settings_dict["NAME"] = str(path)
+        call_command("migrate", verbosity=0, interactive=False)
+        call_command(
+            "seed",
+            customers=customers,
+            orders_per_customer=Distribution(3, 3),
+            items_per_order=Distribution(2, 2),
+            products=max(100, benchmarks.SIZES[size] // 100),
+            verbosity=0,
+        )
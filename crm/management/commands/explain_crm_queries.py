@@ -0,0 +1,103 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from crm.models import Customer, Order, OrderItem, Product
+
+
+def workload():
+    """The CRM's hot access patterns, as querysets."""
+    customer_id = Customer.objects.values_list("pk", flat=True).first() or 1
+    order_id = Order.objects.values_list("pk", flat=True).first() or 1
+    last_week = timezone.now() - timedelta(days=7)
+    return {
+        "customer_latest_order": Order.objects.filter(customer_id=customer_id).order_by("-created_at")[:1],
+        "customer_has_active_order": Order.objects.filter(customer_id=customer_id, status="active")[:1],
+        "orders_by_status_and_date": Order.objects.filter(status="completed", created_at__gte=last_week)[:100],
+        "orders_page": Order.objects.all()[:20],
+        "customers_page": Customer.objects.all()[:20],
+        "low_stock_products": Product.objects.filter(stock__lt=10).order_by("pk")[:500],
+        "order_items_by_created_at": OrderItem.objects.filter(order_id=order_id).order_by("-created_at"),
+    }
+
+
+def workload_indexes():
+    for model in (Customer, Order, OrderItem, Product):
+        yield from model._meta.indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Record EXPLAIN plans and timings for the CRM access patterns with and "
+        "without the workload indexes (dropped inside a rolled-back transaction)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def measure(self, conn, queries, repeat):
+        results = {}
+        with conn.cursor() as cursor:
+            for name, (sql, params) in queries.items():
+                cursor.execute(f"{conn.ops.explain_query_prefix()} {sql}", params)
+                plan = "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[name] = {
+                    "sql": sql % tuple(repr(p) for p in params),
+                    "plan": plan,
+                    "median_ms": round(statistics.median(timings), 3) if timings else None,
+                }
+        return results
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        # Compiled up front: workload() queries the default connection, which
+        # must not run while the other one holds the dropped indexes.
+        queries = {name: queryset.query.sql_with_params() for name, queryset in workload().items()}
+        after = self.measure(connection, queries, repeat)
+
+        # A separate connection, so no statement prepared against the indexed
+        # schema is reused, with the workload indexes dropped and rolled back.
+        bare = connection.copy()
+        try:
+            with bare.cursor() as cursor:
+                cursor.execute("BEGIN")
+                try:
+                    for index in workload_indexes():
+                        cursor.execute(f"DROP INDEX IF EXISTS {bare.ops.quote_name(index.name)}")
+                    before = self.measure(bare, queries, repeat)
+                finally:
+                    cursor.execute("ROLLBACK")
+        finally:
+            bare.close()
+
+        report = {}
+        for name in after:
+            report[name] = {
+                "sql": after[name]["sql"],
+                "before": {"plan": before[name]["plan"], "median_ms": before[name]["median_ms"]},
+                "after": {"plan": after[name]["plan"], "median_ms": after[name]["median_ms"]},
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  before ({before[name]['median_ms']} ms):")
+            for line in before[name]["plan"].splitlines():
+                self.stdout.write(f"    {line}")
+            self.stdout.write(f"  after ({after[name]['median_ms']} ms):")
+            for line in after[name]["plan"].splitlines():
+                self.stdout.write(f"    {line}")
+
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
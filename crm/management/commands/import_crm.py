@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.importer import DEFAULT_BATCH_SIZE, KINDS, CrmImportError, import_stream
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV or JSON Lines export into the CRM in batches. Progress is "
+        "checkpointed per batch, so re-running the same file resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=KINDS)
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start from the first row.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+
+        def progress(result):
+            self.stdout.write(
+                f"{result.skipped + result.processed} rows read, {result.imported} imported, "
+                f"{result.failed} failed"
+            )
+
+        try:
+            with open(path, newline="", encoding="utf-8") as stream:
+                result = import_stream(
+                    options["kind"], stream, fmt,
+                    source=os.path.abspath(path),
+                    batch_size=options["batch_size"],
+                    restart=options["restart"],
+                    progress=progress if options["verbosity"] > 0 else None,
+                )
+        except (OSError, CrmImportError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(error)
+        if result.skipped:
+            self.stdout.write(f"Resumed after {result.skipped} already imported rows.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.imported} {result.kind}, {result.failed} row(s) failed."
+        ))
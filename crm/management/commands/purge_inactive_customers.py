@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.purge import DEFAULT_BATCH_SIZE, DEFAULT_OLDER_THAN_DAYS, purge
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete customers whose last order is older than --older-than days and who have no "
+        "active order, with their orders and items, in short per-chunk transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=DEFAULT_OLDER_THAN_DAYS, metavar="DAYS",
+                            help="Inactivity period in days (default %(default)s).")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Customers deleted per transaction (default %(default)s).")
+        parser.add_argument("--pause", type=float, default=0, metavar="SECONDS",
+                            help="Sleep between chunks to leave the database to other writers.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 0 or options["batch_size"] <= 0:
+            raise CommandError("--older-than must be >= 0 and --batch-size > 0.")
+
+        def progress(result):
+            self.stdout.write(
+                f"Chunk {result.chunks}: {result.customers} customers, {result.orders} orders, "
+                f"{result.items} items so far"
+            )
+
+        result = purge(
+            older_than=timedelta(days=options["older_than"]),
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            pause=options["pause"],
+            progress=progress if options["verbosity"] > 0 else None,
+        )
+        summary = f"{result.customers} customers, {result.orders} orders, {result.items} items"
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Dry run, would delete {summary}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {summary}."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from crm import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the CRM statistics rollup from the base tables (backfill and drift repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drift between the rollup and the base tables.",
+        )
+
+    def handle(self, *args, **options):
+        result = stats.rebuild(dry_run=options["dry_run"])
+        totals, drift = result["totals"], result["drift"]
+        self.stdout.write(
+            f"Totals: {totals['total_customers']} customers, "
+            f"{totals['total_orders']} orders, {totals['total_revenue']} revenue"
+        )
+        self.stdout.write(
+            f"Drift: {drift['total_customers']:+} customers, {drift['total_orders']:+} orders, "
+            f"{drift['total_revenue']:+} revenue; {result['changed_days']} daily bucket(s) differ"
+        )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run, rollup not modified."))
+        else:
+            self.stdout.write(self.style.SUCCESS("CRM statistics rebuilt."))
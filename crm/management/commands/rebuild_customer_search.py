@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the customer search index (SQLite FTS5) from the customers table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only check whether the index matches the customers table.",
+        )
+        parser.add_argument(
+            "--no-optimize",
+            action="store_true",
+            help="Skip merging the index segments after the rebuild.",
+        )
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError("The customer search index needs SQLite FTS5; this database searches customers directly.")
+        if options["check"]:
+            if not search.in_sync():
+                raise CommandError("Customer search index is out of sync; run rebuild_customer_search.")
+            self.stdout.write(self.style.SUCCESS("Customer search index is in sync."))
+            return
+        indexed = search.rebuild(optimize=not options["no_optimize"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} customers."))
@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Add queries to the persisted query manifest used when "
+        "CRM_GRAPHQL_PERSISTED_QUERIES = 'strict'. Each file holds one query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="*", help=".graphql files to register.")
+        parser.add_argument("--remove", action="append", default=[], metavar="SHA256",
+                            help="Remove a registered hash.")
+
+    def handle(self, *args, **options):
+        path = Path(documents.manifest_path())
+        manifest = dict(documents.manifest())
+        for name in options["files"]:
+            try:
+                query = Path(name).read_text().strip()
+            except OSError as e:
+                raise CommandError(f"Cannot read {name}: {e}")
+            sha256 = documents.query_hash(query)
+            manifest[sha256] = query
+            self.stdout.write(f"{sha256}  {name}")
+        for sha256 in options["remove"]:
+            if manifest.pop(sha256, None) is None:
+                raise CommandError(f"{sha256} is not registered.")
+        with open(path, "w") as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        self.stdout.write(self.style.SUCCESS(f"{len(manifest)} persisted queries in {path}"))
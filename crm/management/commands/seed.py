@@ -1,65 +1,131 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from datetime import timedelta, timezone as dt_timezone
-import random
-from faker import Faker
-from crm.models import Customer, Order, OrderItem 
-fake = Faker()
+import multiprocessing
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from crm import stats
+from crm.models import Customer, Order, OrderItem, Product, raw_delete
+from crm.seeding import Distribution, SeedPlan, default_end, generate_chunk, generate_products, seed_email_pattern
+
 
 class Command(BaseCommand):
-    help = "Seed the database with test data."
+    help = (
+        "Seed the database with reproducible synthetic data. Rows are generated in "
+        "parallel worker processes and written with chunked bulk_create."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=10)
+        parser.add_argument("--orders-per-customer", type=Distribution.parse, default=Distribution(1, 5),
+                            help="N or MIN-MAX (uniform). Default 1-5.")
+        parser.add_argument("--items-per-order", type=Distribution.parse, default=Distribution(1, 4),
+                            help="N or MIN-MAX (uniform). Default 1-4.")
+        parser.add_argument("--products", type=int, default=0)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--days", type=int, default=730, help="Spread created_at over this many days.")
+        parser.add_argument("--end", type=datetime.fromisoformat,
+                            help="Latest created_at (ISO date/time). Defaults to midnight UTC today.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Customers per chunk/transaction.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT.")
+        parser.add_argument("--replace", action="store_true",
+                            help="Delete the customers, orders and items of an earlier run with the same --seed first.")
+
+    def handle(self, *args, **options):
+        # call_command() passes keyword options through without their argparse type.
+        end = options["end"] or default_end()
+        if isinstance(end, str):
+            end = datetime.fromisoformat(end)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=dt_timezone.utc)
+        plan = SeedPlan(
+            seed=options["seed"],
+            customers=options["customers"],
+            orders_per_customer=Distribution.parse(options["orders_per_customer"]),
+            items_per_order=Distribution.parse(options["items_per_order"]),
+            end=end,
+            days=options["days"],
+            chunk_size=options["chunk_size"],
+        )
+        # Order numbers are "S<seed>-<customer>-<n>" and must fit Order.order_number.
+        longest = f"S{plan.seed}-{max(plan.customers - 1, 0)}-{plan.orders_per_customer.high}"
+        if len(longest) > Order._meta.get_field("order_number").max_length:
+            raise CommandError("--seed/--customers too large for the order number format.")
+        self.batch_size = options["batch_size"]
+        self.verbosity = options["verbosity"]
+
+        existing = Customer.objects.filter(email__regex=seed_email_pattern(plan.seed))
+        if existing.exists():
+            if not options["replace"]:
+                raise CommandError(f"Seed {plan.seed} is already in the database; pass --replace to regenerate it.")
+            self.stdout.write(f"Deleted {self.clear(existing)} customers of seed {plan.seed}.")
 
-    def handle(self, *args, **kwargs):
         self.stdout.write("Seeding data...")
-        self.seed_customers()
-        self.stdout.write(self.style.SUCCESS("Database seeded successfully!"))
-    
-    # def seed_customers(self, num=10):
-    #     for _ in range(num):
-    #         customer = Customer.objects.create(
-    #             first_name=fake.first_name(),
-    #             last_name=fake.last_name(),
-    #             email=fake.unique.email(),
-    #             phone_number=fake.phone_number(),
-    #             created_at=fake.date_time_between(start_date='-2y', end_date='now', tzinfo=dt_timezone.utc),
-    #         )
+        started = time.monotonic()
+        totals = {"customers": 0, "orders": 0, "items": 0}
 
-    #         self.create_orders(customer, num_orders=random.randint(1, 5))
-    def seed_customers(self, customer=None):
-        customer = Customer.objects.first()  # or use get(pk=...) if you know the ID
-    
-        # Set date to exactly one year ago
-        one_year_ago = timezone.now() - timedelta(days=365)
+        if options["products"]:
+            Product.objects.bulk_create(
+                [Product(**row) for row in generate_products(plan.seed, options["products"])],
+                batch_size=self.batch_size,
+            )
 
-        # Create the order manually
-        order = Order.objects.create(
-            customer=customer,
-            order_number="ORD123456789",
-            status='completed',
-            created_at=one_year_ago,
-            updated_at=one_year_ago
-        )
-    # def create_orders(self, customer, num_orders=2):
-    #     for _ in range(num_orders):
-    #         created_at = fake.date_time_between(start_date='-1y', end_date='now', tzinfo=dt_timezone.utc)
-    #         order = Order.objects.create(
-    #             customer=customer,
-    #             order_number=fake.unique.bothify(text="ORD#######"),
-    #             status=random.choice(['active', 'completed', 'cancelled']),
-    #             created_at=created_at,
-    #             updated_at=created_at + timedelta(days=random.randint(0, 30))
-    #         )
-    #         self.create_order_items(order)
+        generate = partial(generate_chunk, plan)
+        workers = max(1, min(options["workers"], len(plan.chunks())))
+        if workers == 1:
+            chunks = map(generate, plan.chunks())
+            self.write_all(chunks, totals, started)
+        else:
+            # Children must not inherit open database connections.
+            connections.close_all()
+            with multiprocessing.get_context().Pool(workers) as pool:
+                # imap keeps chunk order, so ids are assigned deterministically.
+                self.write_all(pool.imap(generate, plan.chunks()), totals, started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Database seeded successfully! {totals['customers']} customers, {totals['orders']} orders, "
+            f"{totals['items']} items, {options['products']} products in {time.monotonic() - started:.1f}s"
+        ))
+
+    def clear(self, customers):
+        orders = Order.objects.filter(customer__in=customers)
+        items = OrderItem.objects.filter(order__customer__in=customers)
+        with transaction.atomic():
+            stats.subtract(customers=customers, orders=orders, items=items)
+            raw_delete(items)
+            raw_delete(orders)
+            return raw_delete(customers)
 
-    # def create_order_items(self, order, num_items=None):
-    #     if num_items is None:
-    #         num_items = random.randint(1, 4)
+    def write_all(self, chunks, totals, started):
+        for number, rows in enumerate(chunks, start=1):
+            self.write_chunk(rows, totals)
+            if self.verbosity > 1 or number % 10 == 0:
+                self.stdout.write(
+                    f"  {totals['customers']} customers, {totals['orders']} orders, "
+                    f"{totals['items']} items ({time.monotonic() - started:.1f}s)"
+                )
 
-    #     for _ in range(num_items):
-    #         OrderItem.objects.create(
-    #             order=order,
-    #             product_name=fake.word().capitalize(),
-    #             quantity=random.randint(1, 5),
-    #             price=round(random.uniform(10.0, 1000.0), 2)
-    #         )
+    def write_chunk(self, rows, totals):
+        with transaction.atomic():
+            customers = stats.bulk_create(
+                [Customer(**customer) for customer, _orders in rows], batch_size=self.batch_size
+            )
+            orders, order_items = [], []
+            for customer, (_fields, customer_orders) in zip(customers, rows):
+                for order_fields, items in customer_orders:
+                    orders.append(Order(customer=customer, **order_fields))
+                    order_items.append(items)
+            stats.bulk_create(orders, batch_size=self.batch_size)
+            items = [
+                OrderItem(order=order, **item)
+                for order, items in zip(orders, order_items)
+                for item in items
+            ]
+            stats.bulk_create(items, batch_size=self.batch_size)
+        totals["customers"] += len(customers)
+        totals["orders"] += len(orders)
+        totals["items"] += len(items)
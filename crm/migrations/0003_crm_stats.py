@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrmDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='Day')),
+                ('new_customers', models.IntegerField(default=0, verbose_name='New Customers')),
+                ('orders', models.IntegerField(default=0, verbose_name='Orders')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Revenue')),
+            ],
+            options={
+                'verbose_name': 'CRM Daily Statistics',
+                'verbose_name_plural': 'CRM Daily Statistics',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CrmStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_customers', models.BigIntegerField(default=0, verbose_name='Total Customers')),
+                ('total_orders', models.BigIntegerField(default=0, verbose_name='Total Orders')),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Total Revenue')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'CRM Statistics',
+                'verbose_name_plural': 'CRM Statistics',
+            },
+        ),
+    ]
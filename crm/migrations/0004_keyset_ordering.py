@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_crm_stats'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='customer',
+            options={'ordering': ['last_name', 'first_name', 'id'], 'verbose_name': 'Customer', 'verbose_name_plural': 'Customers'},
+        ),
+        migrations.AlterModelOptions(
+            name='order',
+            options={'ordering': ['-created_at', 'id'], 'verbose_name': 'Order', 'verbose_name_plural': 'Orders'},
+        ),
+        migrations.AlterModelOptions(
+            name='orderitem',
+            options={'ordering': ['-created_at', 'id'], 'verbose_name': 'Order Item', 'verbose_name_plural': 'Order Items'},
+        ),
+        migrations.AlterModelOptions(
+            name='product',
+            options={'ordering': ['name', 'id'], 'verbose_name': 'Product', 'verbose_name_plural': 'Products'},
+        ),
+    ]
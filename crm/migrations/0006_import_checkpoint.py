@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_workload_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At'),
+        ),
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, verbose_name='Source')),
+                ('kind', models.CharField(choices=[('customers', 'Customers'), ('orders', 'Orders'), ('items', 'Order Items')], max_length=20, verbose_name='Kind')),
+                ('rows_processed', models.PositiveBigIntegerField(default=0, verbose_name='Rows Processed')),
+                ('rows_imported', models.PositiveBigIntegerField(default=0, verbose_name='Rows Imported')),
+                ('rows_failed', models.PositiveBigIntegerField(default=0, verbose_name='Rows Failed')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Completed At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Import Checkpoint',
+                'verbose_name_plural': 'Import Checkpoints',
+                'constraints': [models.UniqueConstraint(fields=('source', 'kind'), name='crm_import_checkpoint_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='Period')),
+                ('email', models.EmailField(max_length=254, verbose_name='Email')),
+                ('order_number', models.CharField(max_length=20, verbose_name='Order Number')),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Sent At')),
+            ],
+            options={
+                'verbose_name': 'Order Reminder',
+                'verbose_name_plural': 'Order Reminders',
+                'constraints': [models.UniqueConstraint(fields=('period', 'email'), name='crm_order_reminder_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_order_reminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At')),
+                ('full', models.BooleanField(default=False, verbose_name='Full Reconciliation')),
+                ('total_customers', models.BigIntegerField(default=0, verbose_name='Total Customers')),
+                ('total_orders', models.BigIntegerField(default=0, verbose_name='Total Orders')),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Total Revenue')),
+                ('new_customers', models.BigIntegerField(default=0, verbose_name='New Customers')),
+                ('new_orders', models.BigIntegerField(default=0, verbose_name='New Orders')),
+                ('new_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='New Revenue')),
+                ('last_customer_id', models.BigIntegerField(default=0, verbose_name='Last Customer ID')),
+                ('last_order_created_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Order Created At')),
+                ('last_order_id', models.BigIntegerField(default=0, verbose_name='Last Order ID')),
+            ],
+            options={
+                'verbose_name': 'Report Snapshot',
+                'verbose_name_plural': 'Report Snapshots',
+                'ordering': ['-created_at', 'id'],
+                'indexes': [models.Index(fields=['-created_at', 'id'], name='crm_report_snapshot_idx')],
+            },
+        ),
+    ]
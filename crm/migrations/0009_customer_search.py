@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# External-content FTS5 index over the searchable customer columns (see crm.search).
+# The triggers keep it in step with every write to crm_customer, including
+# bulk_create, queryset updates and raw deletes that send no model signals.
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE crm_customer_search USING fts5(
+        first_name, last_name, email, phone_number,
+        content='crm_customer', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER crm_customer_search_insert AFTER INSERT ON crm_customer BEGIN
+        INSERT INTO crm_customer_search(rowid, first_name, last_name, email, phone_number)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_customer_search_delete AFTER DELETE ON crm_customer BEGIN
+        INSERT INTO crm_customer_search(crm_customer_search, rowid, first_name, last_name, email, phone_number)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_customer_search_update
+    AFTER UPDATE OF first_name, last_name, email, phone_number ON crm_customer BEGIN
+        INSERT INTO crm_customer_search(crm_customer_search, rowid, first_name, last_name, email, phone_number)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number);
+        INSERT INTO crm_customer_search(rowid, first_name, last_name, email, phone_number)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number);
+    END
+    """,
+    # Names weigh more than email and phone in the bm25 rank.
+    "INSERT INTO crm_customer_search(crm_customer_search, rank) VALUES ('rank', 'bm25(10.0, 10.0, 4.0, 2.0)')",
+    "INSERT INTO crm_customer_search(crm_customer_search) VALUES ('rebuild')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS crm_customer_search_update",
+    "DROP TRIGGER IF EXISTS crm_customer_search_delete",
+    "DROP TRIGGER IF EXISTS crm_customer_search_insert",
+    "DROP TABLE IF EXISTS crm_customer_search",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # Only SQLite has FTS5; other backends search crm_customer directly.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_report_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
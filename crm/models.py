@@ -1,20 +1,76 @@
 from datetime import timedelta
-from time import timezone
-from django.db import models
+import re
+from django.db import models, transaction
+from django.db.models import Count, DecimalField, Exists, ExpressionWrapper, F, Max, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+# Accepted phone formats: +1234567890 (10-15 digits) or 123-456-7890.
+PHONE_RE = re.compile(r'^(\+?\d{10,15}|(\d{3}-\d{3}-\d{4}))$')
+
+def raw_delete(queryset):
+    # One DELETE ... WHERE: no rows loaded, no signals and no ORM cascade, so
+    # callers apply the cascade and the stats rollup change themselves.
+    return queryset._raw_delete(queryset.db)
+
+class CustomerQuerySet(models.QuerySet):
+    def with_stats(self):
+        # Per-customer order statistics in the same SELECT; the Customer properties
+        # below read these instead of issuing a query per row. Correlated subqueries
+        # (served by the (customer, -created_at) order index) rather than a JOIN and
+        # GROUP BY, so they are evaluated only for the rows a page returns.
+        orders = Order.objects.filter(customer=OuterRef('pk')).order_by()
+
+        def count(queryset):
+            return Coalesce(Subquery(queryset.values('customer_id').annotate(n=Count('id')).values('n')), 0)
+
+        return self.annotate(
+            _is_active=Exists(orders.filter(status='active')),
+            _order_count=count(orders),
+            _completed_order_count=count(orders.filter(status='completed')),
+            _last_order_date=Subquery(orders.order_by('-created_at').values('created_at')[:1]),
+        )
+    def with_recent_orders(self, limit=5):
+        return self.prefetch_related(
+            Prefetch('orders', queryset=Order.objects.order_by('-created_at')[:limit], to_attr='_recent_orders')
+        )
+    def guarded_delete(self):
+        """Delete the customers Customer.delete() allows (those without orders); returns (deleted, refused)."""
+        from . import stats
+
+        has_orders = Exists(Order.objects.filter(customer=OuterRef('pk')))
+        with transaction.atomic(using=self.db):
+            refused = self.filter(has_orders).count()
+            deletable = self.filter(~has_orders)
+            stats.subtract(customers=deletable)
+            return raw_delete(deletable), refused
+
 class Customer(models.Model):
     first_name = models.CharField(max_length=30, verbose_name=_("First Name"))
     last_name = models.CharField(max_length=30, verbose_name=_("Last Name"))
     email = models.EmailField(unique=True, verbose_name=_("Email Address"))
     phone_number = models.CharField(max_length=15, blank=True, null=True, verbose_name=_("Phone Number"))
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    created_at = models.DateTimeField(default=timezone.now, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    objects = CustomerQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Customer")
         verbose_name_plural = _("Customers")
-        ordering = ['last_name', 'first_name']
+        ordering = ['last_name', 'first_name', 'id']
+        indexes = [
+            # Keyset pagination over Meta.ordering.
+            models.Index(fields=['last_name', 'first_name', 'id'], name='crm_customer_name_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored created_at so the stats rollup can move the row's day when it changes.
+        instance._loaded_created_at = dict(zip(field_names, values)).get('created_at')
+        return instance
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -28,7 +84,8 @@ class Customer(models.Model):
     def save(self, *args, **kwargs):
         if not self.email:
             raise ValueError(_("Email address is required."))
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
         if not self.first_name or not self.last_name:
             raise ValueError(_("Both first name and last name are required."))
     def delete(self, *args, **kwargs):
@@ -43,42 +100,100 @@ class Customer(models.Model):
         return self.get_contact_info()
     @property
     def is_active(self):
+        if hasattr(self, '_is_active'):
+            return self._is_active
         return self.orders.filter(status='active').exists()
     @property
     def order_count(self):
+        if hasattr(self, '_order_count'):
+            return self._order_count
         return self.orders.count()
     @property
+    def completed_order_count(self):
+        if hasattr(self, '_completed_order_count'):
+            return self._completed_order_count
+        return self.orders.filter(status='completed').count()
+    @property
     def last_order_date(self):
+        if hasattr(self, '_last_order_date'):
+            return self._last_order_date
         last_order = self.orders.order_by('-created_at').first()
         return last_order.created_at if last_order else None
     @property
     def recent_orders(self):
+        if hasattr(self, '_recent_orders'):
+            return self._recent_orders
         return self.orders.order_by('-created_at')[:5]
     @property
     def has_orders(self):
+        if hasattr(self, '_order_count'):
+            return self._order_count > 0
         return self.orders.exists()
     @property
     def is_new_customer(self):
         return self.created_at >= timezone.now() - timedelta(days=30)
 
+class OrderQuerySet(models.QuerySet):
+    def with_stats(self):
+        completed = (
+            Order.objects.filter(customer=OuterRef('customer_id'), status='completed')
+            .order_by().values('customer_id').annotate(n=Count('id')).values('n')
+        )
+        return self.annotate(_customer_completed_orders=Coalesce(Subquery(completed), 0))
+    def guarded_delete(self):
+        """Delete the orders Order.delete() allows (not active), with their items; returns (deleted, refused)."""
+        from . import stats
+
+        with transaction.atomic(using=self.db):
+            refused = self.filter(status='active').count()
+            deletable = self.exclude(status='active')
+            items = OrderItem.objects.filter(order__in=deletable)
+            stats.subtract(orders=deletable, items=items)
+            raw_delete(items)
+            return raw_delete(deletable), refused
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, related_name='orders', on_delete=models.CASCADE, verbose_name=_("Customer"))
     order_number = models.CharField(max_length=20, unique=True, verbose_name=_("Order Number"))
     status = models.CharField(max_length=20, choices=[('active', 'Active'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='active', verbose_name=_("Status"))
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    created_at = models.DateTimeField(default=timezone.now, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Order")
         verbose_name_plural = _("Orders")
-        ordering = ['-created_at']
+        ordering = ['-created_at', 'id']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='crm_order_created_idx'),
+            # A customer's latest order(s).
+            models.Index(fields=['customer', '-created_at'], name='crm_order_customer_recent_idx'),
+            # Orders by status and date.
+            models.Index(fields=['status', '-created_at'], name='crm_order_status_date_idx'),
+            # Open orders only; small, and backs Customer.is_active. Skipped on
+            # backends without partial index support.
+            models.Index(
+                fields=['customer', '-created_at'],
+                condition=models.Q(status='active'),
+                name='crm_order_active_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored created_at so the stats rollup can move the row's day when it changes.
+        instance._loaded_created_at = dict(zip(field_names, values)).get('created_at')
+        return instance
 
     def __str__(self):
         return f"Order {self.order_number} for {self.customer.get_full_name()}"
     def save(self, *args, **kwargs):
         if not self.order_number:
             raise ValueError(_("Order number is required."))
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     def delete(self, *args, **kwargs):
         if self.status == 'active':
             raise ValueError(_("Cannot delete an active order."))
@@ -115,27 +230,71 @@ class Order(models.Model):
         return self.created_at >= timezone.now() - timedelta(days=7) if self.created_at else False  
     @property
     def is_returning_customer(self):
-        return self.customer.orders.filter(status='completed').count() > 1 if self.customer else False
+        if hasattr(self, '_customer_completed_orders'):
+            return self._customer_completed_orders > 1
+        return self.customer.completed_order_count > 1 if self.customer else False
     
+LINE_TOTAL = ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=20, decimal_places=2))
+
+class OrderItemQuerySet(models.QuerySet):
+    def for_orders(self, status=None, date_from=None, date_to=None, customer_id=None):
+        qs = self
+        if status:
+            qs = qs.filter(order__status=status)
+        if date_from:
+            qs = qs.filter(order__created_at__gte=date_from)
+        if date_to:
+            qs = qs.filter(order__created_at__lte=date_to)
+        if customer_id:
+            qs = qs.filter(order__customer_id=customer_id)
+        return qs
+    def revenue(self):
+        # Single SUM(quantity * price) in the database, no rows are materialised.
+        total = self.aggregate(total=Sum(LINE_TOTAL))['total']
+        return total or 0
+    def guarded_delete(self):
+        """Delete the items OrderItem.delete() allows (not in a completed order); returns (deleted, refused)."""
+        from . import stats
+
+        with transaction.atomic(using=self.db):
+            refused = self.filter(order__status='completed').count()
+            deletable = self.exclude(order__status='completed')
+            stats.subtract(items=deletable)
+            return raw_delete(deletable), refused
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, verbose_name=_("Order"))
     product_name = models.CharField(max_length=100, verbose_name=_("Product Name"))
     quantity = models.PositiveIntegerField(default=1, verbose_name=_("Quantity"))
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("Price"))
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    created_at = models.DateTimeField(default=timezone.now, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    objects = OrderItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Order Item")
         verbose_name_plural = _("Order Items")
-        ordering = ['-created_at']
+        ordering = ['-created_at', 'id']
+        indexes = [
+            # Items of an order by created_at.
+            models.Index(fields=['order', '-created_at'], name='crm_item_order_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so the stats rollup can apply revenue deltas on update.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return f"{self.product_name} (x{self.quantity}) in {self.order.order_number}"
     def save(self, *args, **kwargs):
         if self.quantity <= 0:
             raise ValueError(_("Quantity must be greater than zero."))
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     def delete(self, *args, **kwargs):
         if self.order.status == 'completed':
             raise ValueError(_("Cannot delete items from a completed order."))
@@ -162,6 +321,18 @@ class OrderItem(models.Model):
     def is_new_item(self):
         return self.created_at >= timezone.now() - timedelta(days=7) if self.created_at else False
 
+class ProductQuerySet(models.QuerySet):
+    def guarded_delete(self):
+        """Delete the products Product.delete() allows (out of stock); returns (deleted, refused)."""
+        from . import response_cache
+
+        with transaction.atomic(using=self.db):
+            refused = self.filter(stock__gt=0).count()
+            deleted = raw_delete(self.filter(stock=0))
+            if deleted:
+                response_cache.invalidate(Product)
+            return deleted, refused
+
 class Product(models.Model):
     name = models.CharField(max_length=100, verbose_name=_("Product Name"))
     description = models.TextField(blank=True, null=True, verbose_name=_("Description"))
@@ -170,10 +341,17 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
-        ordering = ['name']
+        ordering = ['name', 'id']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='crm_product_name_idx'),
+            # Low-stock restock: stock < threshold, walked by id.
+            models.Index(fields=['stock', 'id'], name='crm_product_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -193,4 +371,103 @@ class Product(models.Model):
         return self.stock == 0
     @property
     def is_low_stock(self):
-        return self.stock < 10
\ No newline at end of file
+        return self.stock < 10
+
+
+class CrmStats(models.Model):
+    total_customers = models.BigIntegerField(default=0, verbose_name=_("Total Customers"))
+    total_orders = models.BigIntegerField(default=0, verbose_name=_("Total Orders"))
+    total_revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name=_("Total Revenue"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        verbose_name = _("CRM Statistics")
+        verbose_name_plural = _("CRM Statistics")
+
+    def __str__(self):
+        return f"{self.total_customers} customers, {self.total_orders} orders, {self.total_revenue} revenue"
+    @classmethod
+    def current(cls):
+        stats, _created = cls.objects.get_or_create(pk=1)
+        return stats
+
+class CrmDailyStats(models.Model):
+    day = models.DateField(unique=True, verbose_name=_("Day"))
+    new_customers = models.IntegerField(default=0, verbose_name=_("New Customers"))
+    orders = models.IntegerField(default=0, verbose_name=_("Orders"))
+    revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name=_("Revenue"))
+
+    class Meta:
+        verbose_name = _("CRM Daily Statistics")
+        verbose_name_plural = _("CRM Daily Statistics")
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.day}: {self.new_customers} customers, {self.orders} orders, {self.revenue} revenue"
+
+class ReportSnapshot(models.Model):
+    """
+    CRM totals as of one report run, with the high-water marks they cover
+    (last customer id, newest order by created_at/id). The next run only
+    aggregates rows past the marks; a full run recomputes everything.
+    """
+    created_at = models.DateTimeField(default=timezone.now, verbose_name=_("Created At"))
+    full = models.BooleanField(default=False, verbose_name=_("Full Reconciliation"))
+    total_customers = models.BigIntegerField(default=0, verbose_name=_("Total Customers"))
+    total_orders = models.BigIntegerField(default=0, verbose_name=_("Total Orders"))
+    total_revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name=_("Total Revenue"))
+    new_customers = models.BigIntegerField(default=0, verbose_name=_("New Customers"))
+    new_orders = models.BigIntegerField(default=0, verbose_name=_("New Orders"))
+    new_revenue = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name=_("New Revenue"))
+    last_customer_id = models.BigIntegerField(default=0, verbose_name=_("Last Customer ID"))
+    last_order_created_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Last Order Created At"))
+    last_order_id = models.BigIntegerField(default=0, verbose_name=_("Last Order ID"))
+
+    class Meta:
+        verbose_name = _("Report Snapshot")
+        verbose_name_plural = _("Report Snapshots")
+        ordering = ['-created_at', 'id']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='crm_report_snapshot_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d}: {self.total_customers} customers, {self.total_orders} orders, {self.total_revenue} revenue"
+
+class ImportCheckpoint(models.Model):
+    KIND_CHOICES = [('customers', 'Customers'), ('orders', 'Orders'), ('items', 'Order Items')]
+
+    source = models.CharField(max_length=255, verbose_name=_("Source"))
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name=_("Kind"))
+    rows_processed = models.PositiveBigIntegerField(default=0, verbose_name=_("Rows Processed"))
+    rows_imported = models.PositiveBigIntegerField(default=0, verbose_name=_("Rows Imported"))
+    rows_failed = models.PositiveBigIntegerField(default=0, verbose_name=_("Rows Failed"))
+    completed_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Completed At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    class Meta:
+        verbose_name = _("Import Checkpoint")
+        verbose_name_plural = _("Import Checkpoints")
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'kind'], name='crm_import_checkpoint_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} from {self.source}: {self.rows_processed} rows"
+
+class OrderReminder(models.Model):
+    """One reminder sent to a customer on a given day; reruns of that day's dispatch skip it."""
+    period = models.DateField(verbose_name=_("Period"))
+    email = models.EmailField(verbose_name=_("Email"))
+    order_number = models.CharField(max_length=20, verbose_name=_("Order Number"))
+    sent_at = models.DateTimeField(default=timezone.now, verbose_name=_("Sent At"))
+
+    class Meta:
+        verbose_name = _("Order Reminder")
+        verbose_name_plural = _("Order Reminders")
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'email'], name='crm_order_reminder_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.email} on {self.period} ({self.order_number})"
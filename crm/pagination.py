@@ -0,0 +1,125 @@
+"""
+Keyset (cursor) pagination for the Relay connections in crm.schema.
+
+Cursors encode the values of the row's ordering columns (the model's
+Meta.ordering, which always ends in ``id`` so it is total). The next page is
+the rows strictly after that tuple, so page N costs the same index seek as
+page 1 instead of an OFFSET scan.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from graphene import relay
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+
+from . import loaders
+
+
+def ordering_of(model):
+    return [(name.lstrip("-"), name.startswith("-")) for name in model._meta.ordering]
+
+
+def encode_cursor(instance, ordering):
+    values = [
+        instance._meta.get_field(name).value_to_string(instance)
+        for name, _descending in ordering
+    ]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, model, ordering):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError(cursor)
+        return [
+            model._meta.get_field(name).to_python(value)
+            for (name, _descending), value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError, binascii.Error, ValidationError):
+        raise GraphQLError(f"Invalid cursor: {cursor!r}.")
+
+
+def seek(ordering, values, forward=True):
+    """Rows strictly after (forward) or before (backward) the given ordering tuple."""
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(ordering, values):
+        lookup = "lt" if descending == forward else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    # The OR expansion alone makes SQLite search each branch separately and
+    # sort the union. The redundant bound on the leading column turns it into
+    # one range of the ordering index, read in order up to the LIMIT.
+    name, descending = ordering[0]
+    return Q(**{f"{name}__{'lte' if descending == forward else 'gte'}": values[0]}) & condition
+
+
+def _page_size(value, name, field_name):
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if value is None:
+        return None
+    if value < 0:
+        raise GraphQLError(f"`{name}` on the `{field_name}` connection must be a non-negative integer.")
+    if max_limit and value > max_limit:
+        raise GraphQLError(
+            f"Requesting {value} records on the `{field_name}` connection exceeds the "
+            f"`{name}` limit of {max_limit} records."
+        )
+    return value
+
+
+def paginate(queryset, field_name, first=None, after=None, last=None, before=None):
+    """Return one page of queryset as (rows, has_previous_page, has_next_page, ordering)."""
+    first = _page_size(first, "first", field_name)
+    last = _page_size(last, "last", field_name)
+    if first is not None and last is not None:
+        raise GraphQLError(f"Pass either `first` or `last` to the `{field_name}` connection, not both.")
+
+    model = queryset.model
+    ordering = ordering_of(model)
+    queryset = queryset.order_by(*[("-" if descending else "") + name for name, descending in ordering])
+    if after:
+        queryset = queryset.filter(seek(ordering, decode_cursor(after, model, ordering), forward=True))
+    if before:
+        queryset = queryset.filter(seek(ordering, decode_cursor(before, model, ordering), forward=False))
+
+    if last is not None:
+        # Walk backwards from the end (or from `before`) and flip the page back.
+        rows = list(queryset.reverse()[:last + 1])
+        has_more = len(rows) > last
+        rows = rows[:last]
+        rows.reverse()
+        return rows, has_more, before is not None, ordering
+
+    limit = first if first is not None else graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    return rows[:limit], after is not None, has_more, ordering
+
+
+def _build(info, connection_type, queryset, **kwargs):
+    rows, has_previous, has_next, ordering = paginate(queryset, info.field_name, **kwargs)
+    loaders.get_loaders(info).register(rows)
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row, ordering))
+        for row in rows
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous,
+            has_next_page=has_next,
+        ),
+    )
+
+
+def resolve_connection(info, connection_type, queryset, **kwargs):
+    """Resolve a keyset-paginated connection; the page's nodes share one loader batch."""
+    return loaders.run(_build, info, connection_type, queryset, **kwargs)
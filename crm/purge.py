@@ -0,0 +1,99 @@
+"""
+Chunked purge of inactive customers.
+
+A customer is inactive when they have ordered before, but not since the
+cutoff, and have no active order (active orders cannot be deleted). Both
+conditions are NOT EXISTS anti-joins served by the (customer, -created_at)
+order indexes, so finding a chunk never computes every customer's latest
+order.
+
+Customers are walked by primary key in chunks. Each chunk (its customers,
+their orders and their items) is deleted in its own short transaction with
+set-based DELETEs instead of the per-row ORM cascade, and the chunk is taken
+out of the stats rollup in the same transaction. The database write lock is
+therefore held for one chunk at a time, and requests can run between chunks.
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import stats
+from .models import Customer, Order, OrderItem, raw_delete
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_OLDER_THAN_DAYS = 365
+
+
+@dataclass
+class PurgeProgress:
+    customers: int = 0
+    orders: int = 0
+    items: int = 0
+    chunks: int = 0
+
+
+def inactive_customers(cutoff):
+    """Customers with orders, none of them since cutoff and none active."""
+    orders = Order.objects.filter(customer=OuterRef('pk'))
+    return Customer.objects.filter(
+        Exists(orders),
+        ~Exists(orders.filter(created_at__gte=cutoff)),
+        ~Exists(orders.filter(status='active')),
+    )
+
+
+def purge_chunk(ids, cutoff):
+    """Delete one chunk of candidate customers; returns (customers, orders, items) deleted."""
+    with transaction.atomic():
+        # Re-checked inside the transaction: a customer may have ordered since the chunk was picked.
+        ids = list(inactive_customers(cutoff).filter(pk__in=ids).values_list('pk', flat=True))
+        if not ids:
+            return 0, 0, 0
+        customers = Customer.objects.filter(pk__in=ids)
+        orders = Order.objects.filter(customer_id__in=ids)
+        items = OrderItem.objects.filter(order__customer_id__in=ids)
+        stats.subtract(customers=customers, orders=orders, items=items)
+        deleted_items = raw_delete(items)
+        deleted_orders = raw_delete(orders)
+        return raw_delete(customers), deleted_orders, deleted_items
+
+
+def purge(older_than=timedelta(days=DEFAULT_OLDER_THAN_DAYS), batch_size=DEFAULT_BATCH_SIZE,
+          dry_run=False, pause=0, progress=None):
+    """
+    Delete inactive customers (see inactive_customers) in chunks of batch_size.
+
+    With dry_run nothing is deleted and the totals count what would be.
+    progress, if given, is called with the running PurgeProgress after
+    every chunk; pause sleeps between chunks to leave the database to others.
+    """
+    cutoff = timezone.now() - older_than
+    result = PurgeProgress()
+    last_pk = 0
+    while True:
+        ids = list(
+            inactive_customers(cutoff).filter(pk__gt=last_pk)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_pk = ids[-1]
+        if dry_run:
+            customers = len(ids)
+            orders = Order.objects.filter(customer_id__in=ids).count()
+            items = OrderItem.objects.filter(order__customer_id__in=ids).count()
+        else:
+            customers, orders, items = purge_chunk(ids, cutoff)
+        result.customers += customers
+        result.orders += orders
+        result.items += items
+        result.chunks += 1
+        if progress:
+            progress(result)
+        if pause and not dry_run:
+            time.sleep(pause)
+    return result
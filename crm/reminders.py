@@ -0,0 +1,192 @@
+"""
+Order reminder dispatch.
+
+Recent orders are streamed from the GraphQL ``orders`` connection one cursor
+page at a time (newest first, stopping at the first order older than the
+window), so memory holds one page plus the set of emails already handled,
+however many orders the week had. Each customer gets one reminder per run,
+for their most recent order.
+
+Reminders are sent by a bounded pool of CRM_REMINDER_WORKERS threads, paced
+to CRM_REMINDER_RATE per second across the pool, through a Django email
+backend (CRM_REMINDER_EMAIL_BACKEND, default EMAIL_BACKEND; the console and
+file backends work as stubs). Every sent reminder is recorded as an
+OrderReminder row for the day after its page finishes, and emails already
+recorded for the day are skipped, so rerunning a dispatch only sends what the
+previous run did not.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import graphql_client
+from .models import OrderReminder
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+WINDOW = timedelta(days=7)
+
+ORDERS_QUERY = """
+query RecentOrders($first: Int!, $after: String) {
+  orders(first: $first, after: $after) {
+    pageInfo { hasNextPage endCursor }
+    edges { node { orderNumber createdAt customer { firstName email } } }
+  }
+}
+"""
+
+
+def workers():
+    return getattr(settings, 'CRM_REMINDER_WORKERS', 8)
+
+
+def rate():
+    return getattr(settings, 'CRM_REMINDER_RATE', 20)
+
+
+def email_backend():
+    return getattr(settings, 'CRM_REMINDER_EMAIL_BACKEND', None)
+
+
+@dataclass
+class DispatchResult:
+    sent: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+
+class RateLimiter:
+    """Spaces acquire() calls, from any number of threads, at most 1/rate seconds apart."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / rate if rate else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = self.clock()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            self.sleep(at - now)
+
+
+def recent_orders(since, page_size=PAGE_SIZE):
+    """Yield pages of order nodes created at or after since, newest first."""
+    after = None
+    while True:
+        connection = graphql_client.execute_query(ORDERS_QUERY, {"first": page_size, "after": after})["orders"]
+        nodes = [edge["node"] for edge in connection["edges"]]
+        recent = [node for node in nodes if parse_datetime(node["createdAt"]) >= since]
+        if recent:
+            yield recent
+        if len(recent) < len(nodes) or not connection["pageInfo"]["hasNextPage"]:
+            return
+        after = connection["pageInfo"]["endCursor"]
+
+
+def reminder(order):
+    customer = order["customer"]
+    return EmailMessage(
+        subject=f"Your order {order['orderNumber']}",
+        body=(
+            f"Hello {customer['firstName']},\n\n"
+            f"This is a reminder about your recent order {order['orderNumber']}.\n"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[customer["email"]],
+    )
+
+
+class Dispatcher:
+    def __init__(self, now=None, page_size=PAGE_SIZE):
+        self.now = now or timezone.now()
+        self.period = timezone.localdate(self.now)
+        self.page_size = page_size
+        self.limiter = RateLimiter(rate())
+        self.result = DispatchResult()
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        # Backends are not guaranteed thread-safe; each worker opens its own.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = get_connection(email_backend())
+            connection.open()
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def send(self, order):
+        self.limiter.acquire()
+        return self.connection().send_messages([reminder(order)]) == 1
+
+    def pending(self, page, seen):
+        """The page's orders whose customer has not been handled yet, one per email."""
+        emails = {order["customer"]["email"] for order in page} - seen
+        sent = set(
+            OrderReminder.objects.filter(period=self.period, email__in=emails).values_list('email', flat=True)
+        )
+        self.result.skipped += len(sent)
+        seen |= sent
+        orders = []
+        for order in page:
+            email = order["customer"]["email"]
+            if email not in seen:
+                seen.add(email)
+                orders.append(order)
+        return orders
+
+    def run(self):
+        seen = set()
+        try:
+            with ThreadPoolExecutor(max_workers=workers(), thread_name_prefix='crm-reminders') as pool:
+                for page in recent_orders(self.now - WINDOW, self.page_size):
+                    orders = self.pending(page, seen)
+                    # One page in flight at a time bounds the queue and the
+                    # reminders a crash could leave unrecorded.
+                    outcomes = list(pool.map(self.safe_send, orders))
+                    self.record([order for order, ok in zip(orders, outcomes) if ok])
+                    self.result.failed += outcomes.count(False)
+        finally:
+            for connection in self._connections:
+                connection.close()
+        return self.result
+
+    def safe_send(self, order):
+        try:
+            return self.send(order)
+        except Exception:
+            logger.exception("Reminder for order %s failed.", order["orderNumber"])
+            return False
+
+    def record(self, orders):
+        OrderReminder.objects.bulk_create(
+            [
+                OrderReminder(period=self.period, email=order["customer"]["email"], order_number=order["orderNumber"])
+                for order in orders
+            ],
+            ignore_conflicts=True,
+        )
+        self.result.sent += len(orders)
+
+
+def dispatch(now=None, page_size=PAGE_SIZE):
+    """Send the reminders for orders of the past week; returns a DispatchResult."""
+    return Dispatcher(now, page_size).run()
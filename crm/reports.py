@@ -0,0 +1,99 @@
+"""
+Incremental CRM report snapshots.
+
+Each report run stores a ReportSnapshot. Rather than recounting all history,
+a run only aggregates the customers with an id above the previous snapshot's
+``last_customer_id`` and the orders past its (created_at, id) mark, both
+index range scans, and adds them to the previous totals. The new marks are
+taken at the start of the run, so rows committed while it aggregates are
+left for the next one.
+
+Rows the marks cannot see make the running totals drift: deletions, items
+added to older orders, and orders back-dated behind the mark. Every
+CRM_REPORT_RECONCILE_EVERY-th snapshot (and the first one) is therefore a full
+recount, which resets the totals.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Customer, Order, OrderItem, ReportSnapshot
+
+CENT = Decimal('0.01')
+
+
+def reconcile_every():
+    return getattr(settings, 'CRM_REPORT_RECONCILE_EVERY', 4)
+
+
+def latest():
+    return ReportSnapshot.objects.order_by('-created_at', '-id').first()
+
+
+def _revenue(items):
+    # SQLite sums DECIMAL columns as floats; round back to the stored precision.
+    return Decimal(items.revenue()).quantize(CENT)
+
+
+def _needs_full(previous):
+    if previous is None:
+        return True
+    last_full = ReportSnapshot.objects.filter(full=True).order_by('-created_at', '-id').first()
+    if last_full is None:
+        return True
+    since = ReportSnapshot.objects.filter(created_at__gt=last_full.created_at).count()
+    return since + 1 >= reconcile_every()
+
+
+def _after(created_at, pk):
+    """Orders past a (created_at, id) high-water mark."""
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+
+
+def take_snapshot(full=None):
+    """
+    Store and return a new ReportSnapshot.
+
+    full=None reconciles on the CRM_REPORT_RECONCILE_EVERY schedule; True or
+    False forces a full recount or an incremental run.
+    """
+    with transaction.atomic():
+        previous = latest()
+        if full is None:
+            full = _needs_full(previous)
+        full = full or previous is None
+
+        last_customer_id = Customer.objects.aggregate(last=Max('pk'))['last'] or 0
+        newest = Order.objects.order_by('-created_at', '-id').values('created_at', 'id').first()
+        last_order_created_at, last_order_id = (newest['created_at'], newest['id']) if newest else (None, 0)
+
+        customers = Customer.objects.filter(pk__lte=last_customer_id)
+        orders = Order.objects.exclude(_after(last_order_created_at, last_order_id)) if newest else Order.objects.none()
+        new_customers, new_orders = customers, orders
+        if previous is not None:
+            new_customers = customers.filter(pk__gt=previous.last_customer_id)
+            if previous.last_order_created_at is not None:
+                new_orders = orders.filter(_after(previous.last_order_created_at, previous.last_order_id))
+
+        snapshot = ReportSnapshot(
+            full=full,
+            new_customers=new_customers.count(),
+            new_orders=new_orders.count(),
+            new_revenue=_revenue(OrderItem.objects.filter(order__in=new_orders)),
+            last_customer_id=last_customer_id,
+            last_order_created_at=last_order_created_at,
+            last_order_id=last_order_id,
+        )
+        if full:
+            snapshot.total_customers = customers.count()
+            snapshot.total_orders = orders.count()
+            snapshot.total_revenue = _revenue(OrderItem.objects.filter(order__in=orders))
+        else:
+            snapshot.total_customers = previous.total_customers + snapshot.new_customers
+            snapshot.total_orders = previous.total_orders + snapshot.new_orders
+            snapshot.total_revenue = previous.total_revenue + snapshot.new_revenue
+        snapshot.save()
+    return snapshot
@@ -0,0 +1,130 @@
+"""
+Result cache for read-only root fields, on Django's cache framework.
+
+Resolvers decorated with ``cached(field, models)`` store their result under a
+key made of the field name, its arguments and the current *version* of every
+model the field depends on. Saving or deleting one of those models bumps its
+version once the transaction commits (signals connected in CrmConfig.ready;
+bulk paths invalidate through stats.apply_delta), so only the keys that read
+that model stop matching; the rest stay cached. Stale entries simply expire.
+
+When several requests miss the same key at once, the first takes a short lock
+in the cache and recomputes; the others wait for its result instead of
+running the same aggregate.
+
+CRM_RESPONSE_CACHE names the cache alias (None disables caching) and
+CRM_RESPONSE_CACHE_TTLS overrides the per-field TTLs in seconds. Use a shared
+backend (file, Redis, memcached) when jobs and the web server run in separate
+processes; the local-memory backend only sees its own process's writes.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+DEFAULT_TTL = 60
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.01
+PREFIX = 'crm:rc:'
+
+_MISSING = object()
+
+
+def alias():
+    return getattr(settings, 'CRM_RESPONSE_CACHE', 'default')
+
+
+def get_cache():
+    return caches[alias()]
+
+
+def ttl_for(field, default):
+    return getattr(settings, 'CRM_RESPONSE_CACHE_TTLS', {}).get(field, default)
+
+
+def _version_key(model):
+    return f"{PREFIX}ver:{model._meta.label_lower}"
+
+
+def versions(models):
+    cache = get_cache()
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Start from the clock rather than 0, so a version evicted from the
+            # cache can never come back to a value older entries were stored under.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _bump(model):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        cache.add(_version_key(model), time.time_ns(), None)
+
+
+def invalidate(*models):
+    """Invalidate every cached field that depends on one of models, once the current transaction commits."""
+    if alias() is None:
+        return
+    for model in models:
+        transaction.on_commit(functools.partial(_bump, model))
+
+
+def model_changed(sender, **kwargs):
+    if not kwargs.get('raw'):
+        invalidate(sender)
+
+
+def make_key(field, models, kwargs):
+    parts = [field, *versions(models), *(f"{name}={kwargs[name]!r}" for name in sorted(kwargs))]
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f"{PREFIX}{field}:{digest}"
+
+
+def get_or_compute(key, compute, ttl):
+    cache = get_cache()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    lock = f"{key}:lock"
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, ttl)
+            return value
+        finally:
+            cache.delete(lock)
+    # Someone else is computing this key; wait for their result.
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if cache.get(lock) is None:
+            break
+    return compute()
+
+
+def cached(field, models, ttl=DEFAULT_TTL):
+    """Cache a root resolver's result until one of models changes or the TTL expires."""
+    def decorator(resolver):
+        @functools.wraps(resolver)
+        def wrapper(root, info, **kwargs):
+            if alias() is None:
+                return resolver(root, info, **kwargs)
+            return get_or_compute(
+                make_key(field, models, kwargs),
+                lambda: resolver(root, info, **kwargs),
+                ttl_for(field, ttl),
+            )
+        return wrapper
+    return decorator
@@ -1,5 +1,13 @@
+import hashlib
+import io
+
 import graphene
-from .models import Product, Customer, Order  # Ensure all models are imported
+from graphene import relay
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from . import importer, loaders, pagination, reports, response_cache, search, stats
+from .models import Product, Customer, Order, OrderItem, ReportSnapshot  # Ensure all models are imported
 from graphene_django.types import DjangoObjectType
 
 # Product GraphQL Type
@@ -9,46 +17,264 @@ class ProductType(DjangoObjectType):
         fields = ("id", "name", "stock")
 
 
+class CustomerType(DjangoObjectType):
+    class Meta:
+        model = Customer
+        fields = ("id", "first_name", "last_name", "email", "phone_number", "created_at", "orders")
+
+    # Backed by CustomerQuerySet.with_stats() annotations when the customer was
+    # loaded through a root list or the customer loader.
+    is_active = graphene.Boolean()
+    order_count = graphene.Int()
+    last_order_date = graphene.DateTime()
+    has_orders = graphene.Boolean()
+    recent_orders = graphene.List(graphene.NonNull(lambda: OrderType))
+
+    # The with_stats()/prefetch attribute each property above reads when present;
+    # the async view resolves those inline (see views.ResolversInThreads).
+    loaded_from = {
+        "is_active": "_is_active",
+        "order_count": "_order_count",
+        "last_order_date": "_last_order_date",
+        "has_orders": "_order_count",
+        "recent_orders": "_recent_orders",
+    }
+
+    def resolve_orders(self, info):
+        return loaders.load(info, "orders", self)
+
+    def resolve_recent_orders(self, info):
+        if hasattr(self, "_recent_orders"):
+            return self._recent_orders
+        return loaders.then(loaders.load(info, "orders", self), lambda orders: orders[:5])
+
+
+class OrderType(DjangoObjectType):
+    class Meta:
+        model = Order
+        fields = ("id", "order_number", "status", "created_at", "customer", "items")
+
+    def resolve_customer(self, info):
+        return loaders.load(info, "customer", self)
+
+    def resolve_items(self, info):
+        return loaders.load(info, "items", self)
+
+
+class OrderItemType(DjangoObjectType):
+    class Meta:
+        model = OrderItem
+        fields = ("id", "product_name", "quantity", "price", "created_at", "order")
+
+    def resolve_order(self, info):
+        return loaders.load(info, "order", self)
+
+
+class ReportSnapshotType(DjangoObjectType):
+    class Meta:
+        model = ReportSnapshot
+        fields = (
+            "id", "created_at", "full", "total_customers", "total_orders", "total_revenue",
+            "new_customers", "new_orders", "new_revenue", "last_order_created_at",
+        )
+
+
+# Relay connections, paginated by keyset over each model's Meta.ordering
+class CustomerConnection(relay.Connection):
+    class Meta:
+        node = CustomerType
+
+
+class OrderConnection(relay.Connection):
+    class Meta:
+        node = OrderType
+
+
+class ProductConnection(relay.Connection):
+    class Meta:
+        node = ProductType
+
+
+class ReportSnapshotConnection(relay.Connection):
+    class Meta:
+        node = ReportSnapshotType
+
+
 # Mutation: Update Low Stock Products
+RESTOCK_CHUNK_SIZE = 500
+
+
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        pass
+        threshold = graphene.Int(default_value=10)
+        increment = graphene.Int(default_value=10)
 
     updated_products = graphene.List(ProductType)
     message = graphene.String()
 
-    def mutate(self, info):
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated = []
+    def mutate(self, info, threshold=10, increment=10):
+        if increment <= 0:
+            raise graphene.GraphQLError("Increment must be a positive number.")
 
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated.append(product)
+        updated = []
+        last_pk = 0
+        while True:
+            # One short transaction per chunk: lock the rows, then restock them with a
+            # single UPDATE that re-checks the threshold so overlapping runs cannot
+            # restock the same product twice.
+            with transaction.atomic():
+                ids = list(
+                    Product.objects.select_for_update()
+                    .filter(stock__lt=threshold, pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:RESTOCK_CHUNK_SIZE]
+                )
+                if not ids:
+                    break
+                stamp = timezone.now()
+                if Product.objects.filter(pk__in=ids, stock__lt=threshold).update(
+                    stock=F("stock") + increment, updated_at=stamp
+                ):
+                    # Report only the rows this UPDATE changed: a product an overlapping
+                    # run restocked first no longer matched it and kept its updated_at.
+                    updated.extend(
+                        Product.objects.filter(pk__in=ids, updated_at=stamp)
+                        .order_by("pk").only("id", "name", "stock")
+                    )
+            last_pk = ids[-1]
 
+        if updated:
+            # update() sends no signals.
+            response_cache.invalidate(Product)
         return UpdateLowStockProducts(
             updated_products=updated,
             message=f"{len(updated)} product(s) restocked."
         )
 
 
+# Mutation: Import CRM Data (the upload counterpart of `manage.py import_crm`)
+class ImportCrmData(graphene.Mutation):
+    class Arguments:
+        kind = graphene.String(required=True)
+        data = graphene.String(required=True)
+        format = graphene.String(default_value="csv")
+        source = graphene.String()
+        restart = graphene.Boolean(default_value=False)
+
+    imported = graphene.Int()
+    failed = graphene.Int()
+    skipped = graphene.Int()
+    errors = graphene.List(graphene.String)
+
+    def mutate(self, info, kind, data, format="csv", source=None, restart=False):
+        # Without a client-chosen source name, identical uploads share a checkpoint.
+        source = source or "upload:" + hashlib.sha256(data.encode()).hexdigest()
+        try:
+            result = importer.import_stream(kind, io.StringIO(data), format, source=source, restart=restart)
+        except importer.CrmImportError as e:
+            raise graphene.GraphQLError(str(e))
+        return ImportCrmData(
+            imported=result.imported,
+            failed=result.failed,
+            skipped=result.skipped,
+            errors=result.errors,
+        )
+
+
+class RevenueGranularity(graphene.Enum):
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+
+
+class RevenuePeriodType(graphene.ObjectType):
+    period_start = graphene.Date()
+    orders = graphene.Int()
+    revenue = graphene.Float()
+
+
 # CRM Report Queries
 class Query(graphene.ObjectType):
+    customers = relay.ConnectionField(CustomerConnection)
+    orders = relay.ConnectionField(OrderConnection)
+    products = relay.ConnectionField(ProductConnection)
+    report_snapshots = relay.ConnectionField(ReportSnapshotConnection)
+    latest_report_snapshot = graphene.Field(ReportSnapshotType)
     total_customers = graphene.Int()
     total_orders = graphene.Int()
-    total_revenue = graphene.Float()
+    total_revenue = graphene.Float(
+        status=graphene.String(),
+        date_from=graphene.DateTime(name="from"),
+        date_to=graphene.DateTime(name="to"),
+        customer_id=graphene.ID(),
+    )
+    search_customers = graphene.List(
+        graphene.NonNull(CustomerType),
+        query=graphene.String(required=True),
+        first=graphene.Int(default_value=search.DEFAULT_RESULTS),
+    )
+    revenue_by_period = graphene.List(
+        graphene.NonNull(RevenuePeriodType),
+        granularity=RevenueGranularity(required=True),
+        date_from=graphene.DateTime(name="from"),
+        date_to=graphene.DateTime(name="to"),
+        status=graphene.String(),
+    )
+
+    def resolve_customers(self, info, **kwargs):
+        return pagination.resolve_connection(info, CustomerConnection, Customer.objects.with_stats(), **kwargs)
 
+    def resolve_orders(self, info, **kwargs):
+        return pagination.resolve_connection(info, OrderConnection, Order.objects.all(), **kwargs)
+
+    def resolve_products(self, info, **kwargs):
+        return pagination.resolve_connection(info, ProductConnection, Product.objects.all(), **kwargs)
+
+    def resolve_search_customers(self, info, query, first):
+        return search.search(query, first)
+
+    def resolve_report_snapshots(self, info, **kwargs):
+        return pagination.resolve_connection(info, ReportSnapshotConnection, ReportSnapshot.objects.all(), **kwargs)
+
+    def resolve_latest_report_snapshot(self, info):
+        return reports.latest()
+
+    @response_cache.cached('totalCustomers', (Customer,))
     def resolve_total_customers(self, info):
+        if stats.rollup_enabled():
+            return stats.totals()['total_customers']
         return Customer.objects.count()
 
+    @response_cache.cached('totalOrders', (Order,))
     def resolve_total_orders(self, info):
+        if stats.rollup_enabled():
+            return stats.totals()['total_orders']
         return Order.objects.count()
 
-    def resolve_total_revenue(self, info):
-        return sum(order.total_amount for order in Order.objects.all())
+    @response_cache.cached('totalRevenue', (Order, OrderItem))
+    def resolve_total_revenue(self, info, status=None, date_from=None, date_to=None, customer_id=None):
+        if stats.rollup_enabled() and not (status or date_from or date_to or customer_id):
+            return float(stats.totals()['total_revenue'])
+        revenue = OrderItem.objects.for_orders(
+            status=status,
+            date_from=date_from,
+            date_to=date_to,
+            customer_id=customer_id,
+        ).revenue()
+        return float(revenue)
+
+    @response_cache.cached('revenueByPeriod', (Order, OrderItem))
+    def resolve_revenue_by_period(self, info, granularity, date_from=None, date_to=None, status=None):
+        return [
+            {**period, 'revenue': float(period['revenue'])}
+            for period in stats.revenue_by_period(
+                getattr(granularity, 'value', granularity), date_from=date_from, date_to=date_to, status=status,
+            )
+        ]
 
 
 # Root Mutation
 class Mutation(graphene.ObjectType):
     update_low_stock_products = UpdateLowStockProducts.Field()
+    import_crm_data = ImportCrmData.Field()
 
@@ -0,0 +1,93 @@
+"""
+Customer search for autocomplete.
+
+On SQLite, customers are indexed in the crm_customer_search FTS5 table
+(migration 0009), an external-content index over first_name, last_name, email
+and phone_number. Triggers on crm_customer keep it in sync with every write,
+so bulk_create and the raw deletes of the purge are covered as well as model
+saves. Every word of a query is matched as a prefix (all words must match)
+and results are ordered by bm25 rank, names weighted above email and phone.
+
+Ranking has to score every match, so queries made only of words shorter than
+RANK_MIN_LENGTH (a first keystroke can match millions of customers) take the
+first matches in index order instead; the 1-3 character prefix indexes serve
+those without scanning the term list.
+
+Other backends, or CRM_CUSTOMER_SEARCH_FTS = False, fall back to prefix
+matches on the names and phone and a substring match on email, ordered like
+the customers connection. That is a table scan and meant for small tables.
+"""
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Q
+
+from .models import Customer
+
+TABLE = 'crm_customer_search'
+DEFAULT_RESULTS = 10
+MAX_RESULTS = 50
+RANK_MIN_LENGTH = 3
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite' and getattr(settings, 'CRM_CUSTOMER_SEARCH_FTS', True)
+
+
+def words(query):
+    # Split like the unicode61 tokenizer: runs of letters and digits.
+    return re.findall(r'[^\W_]+', query.lower())
+
+
+def match_expression(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _matching_ids(terms, limit):
+    sql = f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s"
+    if max(len(term) for term in terms) >= RANK_MIN_LENGTH:
+        sql += " ORDER BY rank"
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} LIMIT %s", [match_expression(terms), limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(query, first=DEFAULT_RESULTS):
+    """Return up to first (capped at MAX_RESULTS) customers matching every word of query."""
+    terms = words(query)
+    if not terms:
+        return []
+    first = max(1, min(first, MAX_RESULTS))
+    if fts_enabled():
+        ids = _matching_ids(terms, first)
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(first_name__istartswith=term) | Q(last_name__istartswith=term)
+                | Q(email__icontains=term) | Q(phone_number__contains=term)
+            )
+        ids = list(Customer.objects.filter(condition).values_list('pk', flat=True)[:first])
+    # Order statistics only for the page of matches, never for every candidate row.
+    found = Customer.objects.with_stats().in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
+
+
+def rebuild(optimize=True):
+    """Re-index every customer from crm_customer; returns the number indexed."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return Customer.objects.count()
+
+
+def in_sync():
+    """Whether the index matches crm_customer (FTS5 integrity-check against the content table)."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}, rank) VALUES ('integrity-check', 1)")
+    except DatabaseError:
+        return False
+    return True
@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic CRM data.
+
+generate_chunk() is pure Python (no Django imports) so it can run in worker
+processes. Every chunk of customers draws from its own RNG seeded with
+(seed, chunk index), so the dataset depends only on the seed and the options,
+never on the number of workers or the order in which chunks finish.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from faker import Faker
+
+STATUSES = ('active', 'completed', 'cancelled')
+STATUS_WEIGHTS = (20, 70, 10)
+PRODUCT_NAMES = (
+    'Laptop', 'Monitor', 'Keyboard', 'Mouse', 'Headset', 'Webcam', 'Dock',
+    'Cable', 'Charger', 'Tablet', 'Phone', 'Speaker', 'Printer', 'Router',
+)
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """Uniform integer range, written as "N" or "MIN-MAX" on the command line."""
+
+    low: int
+    high: int
+
+    @classmethod
+    def parse(cls, text):
+        if isinstance(text, cls):
+            return text
+        low, _, high = str(text).partition('-')
+        low = int(low)
+        high = int(high) if high else low
+        if low < 0 or high < low:
+            raise ValueError(f"Invalid distribution {text!r}; use N or MIN-MAX with 0 <= MIN <= MAX.")
+        return cls(low, high)
+
+    def sample(self, rng):
+        return rng.randint(self.low, self.high)
+
+
+@dataclass(frozen=True)
+class SeedPlan:
+    seed: int
+    customers: int
+    orders_per_customer: Distribution
+    items_per_order: Distribution
+    end: datetime
+    days: int
+    chunk_size: int
+
+    def chunks(self):
+        return range((self.customers + self.chunk_size - 1) // self.chunk_size)
+
+
+def seed_email_pattern(seed):
+    """Regex matching the emails generate_chunk() gives the customers of seed."""
+    return rf"\.{seed}-[0-9]+@example\.com$"
+
+
+def _timestamp(rng, start, end):
+    span = max((end - start).total_seconds(), 0)
+    return start + timedelta(seconds=rng.uniform(0, span))
+
+
+def generate_chunk(plan, chunk):
+    """
+    Return the customers of one chunk as nested tuples:
+    [(customer_fields, [(order_fields, [item_fields, ...]), ...]), ...]
+    """
+    rng = random.Random(f"{plan.seed}:{chunk}")
+    fake = Faker()
+    fake.seed_instance(f"{plan.seed}:{chunk}")
+    start = plan.end - timedelta(days=plan.days)
+    first = chunk * plan.chunk_size
+    rows = []
+    for index in range(first, min(first + plan.chunk_size, plan.customers)):
+        first_name, last_name = fake.first_name()[:30], fake.last_name()[:30]
+        customer_created = _timestamp(rng, start, plan.end)
+        customer = {
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': f"{first_name}.{last_name}.{plan.seed}-{index}@example.com".lower(),
+            'phone_number': f"+1{rng.randrange(10**9, 10**10)}" if rng.random() < 0.8 else None,
+            'created_at': customer_created,
+        }
+        orders = []
+        for n in range(plan.orders_per_customer.sample(rng)):
+            order_created = _timestamp(rng, customer_created, plan.end)
+            order = {
+                'order_number': f"S{plan.seed}-{index}-{n}",
+                'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                'created_at': order_created,
+            }
+            items = [
+                {
+                    'product_name': rng.choice(PRODUCT_NAMES),
+                    'quantity': rng.randint(1, 5),
+                    'price': f"{rng.uniform(5, 1500):.2f}",
+                    'created_at': order_created,
+                }
+                for _ in range(plan.items_per_order.sample(rng))
+            ]
+            orders.append((order, items))
+        rows.append((customer, orders))
+    return rows
+
+
+def generate_products(seed, count):
+    rng = random.Random(f"{seed}:products")
+    return [
+        {
+            'name': f"{rng.choice(PRODUCT_NAMES)} {n}",
+            'price': f"{rng.uniform(5, 1500):.2f}",
+            'stock': rng.randint(0, 100),
+        }
+        for n in range(count)
+    ]
+
+
+def default_end():
+    """Midnight UTC today, so a seed reproduces the same timestamps all day."""
+    now = datetime.now(timezone.utc)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from celery.schedules import crontab
 
@@ -73,6 +75,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'alx_backend_graphql_crm.wsgi.application'
+ASGI_APPLICATION = 'alx_backend_graphql_crm.asgi.application'
 
 
 # Database
@@ -129,7 +132,71 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # GraphQL settings
 GRAPHENE = {
-    'SCHEMA': 'crm.schema.schema',  # Path to your GraphQL schema
+    'SCHEMA': 'graphql_crm.schema.schema',  # Path to your GraphQL schema
+    'RELAY_CONNECTION_MAX_LIMIT': 100,  # Maximum page size for customers/orders/products
+}
+# Serve totalCustomers/totalOrders/totalRevenue from the crm.stats rollup tables
+CRM_STATS_ROLLUP = True
+# Per-resolver timing and SQL counts for /graphql (crm.instrumentation), off by default.
+# Reports go to the crm.instrumentation logger, or into the response extensions when
+# the request sends an X-GraphQL-Debug header (DEBUG or staff only).
+CRM_GRAPHQL_INSTRUMENTATION = False
+CRM_GRAPHQL_N_PLUS_ONE_THRESHOLD = 5  # same SQL shape more often than this is flagged
+# Parsed-and-validated documents kept per process, and persisted queries (crm.documents):
+# 'apq' (Automatic Persisted Queries), 'strict' (only hashes registered with
+# `manage.py register_persisted_queries`) or 'off'.
+CRM_GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+CRM_GRAPHQL_PERSISTED_QUERIES = 'apq'
+# Static cost/depth admission control (crm.cost). Lists without first/last count as
+# CRM_GRAPHQL_DEFAULT_LIST_SIZE items; CRM_GRAPHQL_COST_PER_MINUTE is a per-client
+# budget (None disables throttling).
+CRM_GRAPHQL_MAX_DEPTH = 8
+CRM_GRAPHQL_MAX_COST = 5000
+CRM_GRAPHQL_DEFAULT_LIST_SIZE = 10
+CRM_GRAPHQL_COST_PER_MINUTE = 200000
+# Result cache for the read-only report fields (crm.response_cache), invalidated by
+# model signals. Local memory only sees this process's writes; point 'default' at
+# django.core.cache.backends.filebased.FileBasedCache (or Redis) when cron jobs and
+# the server are separate processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crm',
+    },
+}
+CRM_RESPONSE_CACHE = 'default'  # cache alias, or None to disable
+CRM_RESPONSE_CACHE_TTLS = {'totalCustomers': 300, 'totalOrders': 300, 'totalRevenue': 300}
+# Serve /graphql with the async view (set by asgi.py). Blocking ORM work then runs in a
+# pool of CRM_GRAPHQL_ORM_THREADS threads shared by all requests.
+CRM_GRAPHQL_ASYNC = os.environ.get('CRM_GRAPHQL_ASYNC') == '1'
+CRM_GRAPHQL_ORM_THREADS = 8
+CRM_GRAPHQL_MAX_BATCH_SIZE = 20  # operations per batched (JSON array) request
+# How cron jobs and Celery tasks reach the schema: 'auto' (in-process, falling back
+# to HTTP at CRM_GRAPHQL_URL), 'local' or 'http'. See crm/graphql_client.py.
+CRM_GRAPHQL_JOB_TRANSPORT = 'auto'
+CRM_GRAPHQL_URL = 'http://localhost:8000/graphql'
+# Job client over HTTP: per-call timeout (seconds), retries of connection errors and
+# 429/5xx answers with exponential backoff, and where the introspected schema is kept.
+CRM_GRAPHQL_CLIENT_TIMEOUT = 10
+CRM_GRAPHQL_CLIENT_RETRIES = 3
+CRM_GRAPHQL_CLIENT_BACKOFF = 0.5
+CRM_GRAPHQL_SCHEMA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'crm-graphql-schema')
+# Order reminders (crm/reminders.py): sender threads, emails per second across them, and
+# the email backend they use (None for EMAIL_BACKEND). Console by default; use
+# 'django.core.mail.backends.filebased.EmailBackend' with EMAIL_FILE_PATH to keep them.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+CRM_REMINDER_WORKERS = 8
+CRM_REMINDER_RATE = 20
+CRM_REMINDER_EMAIL_BACKEND = None
+# Every Nth report snapshot (crm/reports.py) recounts all history instead of adding the new rows.
+CRM_REPORT_RECONCILE_EVERY = 4
+# searchCustomers uses the SQLite FTS5 index (crm/search.py); False searches the customers table directly.
+CRM_CUSTOMER_SEARCH_FTS = True
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'crm.instrumentation': {'handlers': ['console'], 'level': 'INFO'}},
 }
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
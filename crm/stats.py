@@ -0,0 +1,397 @@
+"""
+Incrementally maintained CRM statistics.
+
+Totals live in a single CrmStats row and per-day buckets in CrmDailyStats.
+Model signals keep both up to date inside the writing transaction, so the
+report resolvers read a row instead of scanning the tables. Bulk writes, which
+send no signals, go through bulk_create() (or record_created() for rows
+already inserted) and subtract(); rebuild() recomputes everything from the
+base tables to backfill or repair drift.
+
+revenue_by_period() groups the closed days of a range from the daily buckets
+and only aggregates orders for the days still open.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateField, DecimalField, F, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from . import response_cache
+from .models import LINE_TOTAL, CrmDailyStats, CrmStats, Customer, Order, OrderItem
+
+
+CENT = Decimal('0.01')
+GRANULARITIES = ('day', 'week', 'month')
+ORDER_REVENUE = Sum(F('items__quantity') * F('items__price'), output_field=DecimalField(max_digits=20, decimal_places=2))
+
+
+def rollup_enabled():
+    return getattr(settings, 'CRM_STATS_ROLLUP', True)
+
+
+def day_of(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _bump(queryset, create, **changes):
+    # UPDATE first; only a missing bucket costs the extra INSERT.
+    if not queryset.update(**changes):
+        create()
+        queryset.update(**changes)
+
+
+def apply_delta(day, customers=0, orders=0, revenue=0, initialise=True):
+    """
+    Add a change to the totals and day's bucket. Returns True when there was no
+    rollup yet: with initialise it is rebuilt from the base tables instead,
+    which already include this and any other change of the same write;
+    without (rows not deleted yet) it is left for totals() to build later.
+    """
+    if not (customers or orders or revenue):
+        return False
+    # Bulk paths come through here without model signals.
+    response_cache.invalidate(*(
+        model for model, changed in ((Customer, customers), (Order, orders), (OrderItem, revenue)) if changed
+    ))
+    with transaction.atomic():
+        if not CrmStats.objects.filter(pk=1).update(
+            total_customers=F('total_customers') + customers,
+            total_orders=F('total_orders') + orders,
+            total_revenue=F('total_revenue') + revenue,
+            updated_at=timezone.now(),
+        ):
+            # No rollup yet: initialise it from the base tables, which already
+            # include the change being recorded.
+            if initialise:
+                rebuild()
+            return True
+        if day is not None:
+            _bump(
+                CrmDailyStats.objects.filter(day=day),
+                lambda: CrmDailyStats.objects.get_or_create(day=day),
+                new_customers=F('new_customers') + customers,
+                orders=F('orders') + orders,
+                revenue=F('revenue') + revenue,
+            )
+
+
+def subtract(customers=None, orders=None, items=None):
+    """
+    Take rows that are about to be deleted without signals out of the rollup:
+    one apply_delta per affected day. Each argument is a queryset of the
+    rows going away; call it before deleting them.
+    """
+    days = defaultdict(lambda: {'customers': 0, 'orders': 0, 'revenue': Decimal('0')})
+    for key, queryset, day_field in (('customers', customers, 'created_at'), ('orders', orders, 'created_at')):
+        if queryset is None:
+            continue
+        rows = queryset.order_by().annotate(day=TruncDate(day_field)).values('day').annotate(n=Count('id'))
+        for row in rows:
+            days[row['day']][key] -= row['n']
+    if items is not None:
+        rows = (
+            items.order_by().annotate(day=TruncDate('order__created_at'))
+            .values('day').annotate(total=Sum(LINE_TOTAL))
+        )
+        for row in rows:
+            days[row['day']]['revenue'] -= Decimal(row['total'] or 0).quantize(CENT)
+    # Without a rollup yet, rebuilding now would count the rows still there.
+    _apply_days(days, initialise=False)
+
+
+def record_created(objects):
+    """
+    Add Customer, Order and OrderItem rows just inserted without signals to the
+    rollup: one apply_delta per affected day. Items take their order's day, from
+    the cached order or one query for the rest; other models are ignored.
+    """
+    days = defaultdict(lambda: {'customers': 0, 'orders': 0, 'revenue': Decimal('0')})
+    items = []
+    for obj in objects:
+        if isinstance(obj, Customer):
+            days[day_of(obj.created_at)]['customers'] += 1
+        elif isinstance(obj, Order):
+            days[day_of(obj.created_at)]['orders'] += 1
+        elif isinstance(obj, OrderItem):
+            items.append(obj)
+    if items:
+        uncached = {item.order_id for item in items if not OrderItem.order.is_cached(item)}
+        created = dict(Order.objects.filter(pk__in=uncached).values_list('pk', 'created_at')) if uncached else {}
+        for item in items:
+            created_at = item.order.created_at if OrderItem.order.is_cached(item) else created.get(item.order_id)
+            if created_at is not None:
+                days[day_of(created_at)]['revenue'] += _line_total(_item_values(item))
+    _apply_days(days)
+
+
+def _apply_days(days, initialise=True):
+    for day, delta in days.items():
+        if apply_delta(day, initialise=initialise, **delta):
+            break
+
+
+def bulk_create(objects, **kwargs):
+    """Model.objects.bulk_create() for one model's rows, recorded in the rollup in the same transaction."""
+    if not objects:
+        return []
+    # Joins the caller's transaction without a savepoint of its own.
+    with transaction.atomic(savepoint=False):
+        objects = type(objects[0]).objects.bulk_create(objects, **kwargs)
+        record_created(objects)
+    return objects
+
+
+def _order_day(item, order_id):
+    if OrderItem.order.is_cached(item) and item.order.pk == order_id:
+        return day_of(item.order.created_at)
+    created_at = Order.objects.filter(pk=order_id).values_list('created_at', flat=True).first()
+    return day_of(created_at) if created_at else None
+
+
+def _line_total(values):
+    return (values['quantity'] or 0) * (values['price'] or Decimal('0'))
+
+
+def _item_values(item):
+    return {'order_id': item.order_id, 'quantity': item.quantity, 'price': Decimal(item.price)}
+
+
+# === Signal handlers (connected in CrmConfig.ready) ===
+
+def _stored_day(instance):
+    return day_of(getattr(instance, '_loaded_created_at', None) or instance.created_at)
+
+
+def _moved(instance, update_fields):
+    """The day instance was stored under, if this save moved its created_at to another day."""
+    if update_fields is not None and 'created_at' not in update_fields:
+        return None
+    loaded = getattr(instance, '_loaded_created_at', None)
+    instance._loaded_created_at = instance.created_at
+    if loaded is None:
+        return None
+    old = day_of(loaded)
+    return old if old != day_of(instance.created_at) else None
+
+
+def customer_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        instance._loaded_created_at = instance.created_at
+        apply_delta(day_of(instance.created_at), customers=1)
+        return
+    old = _moved(instance, update_fields)
+    if old is not None and not apply_delta(old, customers=-1):
+        apply_delta(day_of(instance.created_at), customers=1)
+
+
+def customer_deleted(sender, instance, **kwargs):
+    apply_delta(_stored_day(instance), customers=-1)
+
+
+def order_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        instance._loaded_created_at = instance.created_at
+        apply_delta(day_of(instance.created_at), orders=1)
+        return
+    old = _moved(instance, update_fields)
+    if old is None:
+        return
+    # The order's items are bucketed by its day, so their revenue moves with it.
+    total = instance.items.order_by().aggregate(total=Sum(LINE_TOTAL))['total']
+    revenue = Decimal(total or 0).quantize(CENT)
+    if not apply_delta(old, orders=-1, revenue=-revenue):
+        apply_delta(day_of(instance.created_at), orders=1, revenue=revenue)
+
+
+def order_deleted(sender, instance, **kwargs):
+    apply_delta(_stored_day(instance), orders=-1)
+
+
+def order_item_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = _item_values(instance)
+    old = None if created else getattr(instance, '_loaded_values', None)
+    if old is None and not created:
+        # Saved without having been loaded (e.g. a bare pk update); nothing to diff against.
+        instance._loaded_values = new
+        return
+    if old is not None and old['order_id'] == new['order_id']:
+        delta = _line_total(new) - _line_total(old)
+        if delta:
+            apply_delta(_order_day(instance, new['order_id']), revenue=delta)
+    else:
+        rebuilt = old is not None and apply_delta(_order_day(instance, old['order_id']), revenue=-_line_total(old))
+        if not rebuilt:
+            apply_delta(_order_day(instance, new['order_id']), revenue=_line_total(new))
+    instance._loaded_values = new
+
+
+def order_item_pre_delete(sender, instance, **kwargs):
+    # Every pre_delete fires before any row is removed, so the order is still readable
+    # here even when the item is deleted as part of an order cascade.
+    values = getattr(instance, '_loaded_values', None) or _item_values(instance)
+    instance._stats_day = _order_day(instance, values['order_id'])
+
+
+def order_item_deleted(sender, instance, **kwargs):
+    values = getattr(instance, '_loaded_values', None) or _item_values(instance)
+    apply_delta(getattr(instance, '_stats_day', None), revenue=-_line_total(values))
+
+
+# === Reads and rebuild ===
+
+def totals():
+    stats = CrmStats.objects.filter(pk=1).first()
+    if stats is None:
+        return rebuild()['totals']
+    return {
+        'total_customers': stats.total_customers,
+        'total_orders': stats.total_orders,
+        'total_revenue': stats.total_revenue,
+    }
+
+
+def compute():
+    """Recompute totals and daily buckets from the base tables."""
+    days = defaultdict(lambda: {'new_customers': 0, 'orders': 0, 'revenue': Decimal('0')})
+    rows = (
+        Customer.objects.order_by().annotate(day=TruncDate('created_at'))
+        .values('day').annotate(n=Count('id'))
+    )
+    for row in rows:
+        days[row['day']]['new_customers'] = row['n']
+    rows = (
+        Order.objects.order_by().annotate(day=TruncDate('created_at'))
+        .values('day').annotate(n=Count('id'))
+    )
+    for row in rows:
+        days[row['day']]['orders'] = row['n']
+    rows = (
+        OrderItem.objects.order_by().annotate(day=TruncDate('order__created_at'))
+        .values('day').annotate(total=Sum(LINE_TOTAL))
+    )
+    for row in rows:
+        # SQLite sums DECIMAL columns as floats; round back to the stored precision.
+        days[row['day']]['revenue'] = Decimal(row['total'] or 0).quantize(CENT)
+    totals = {
+        'total_customers': sum(d['new_customers'] for d in days.values()),
+        'total_orders': sum(d['orders'] for d in days.values()),
+        'total_revenue': sum((d['revenue'] for d in days.values()), Decimal('0')),
+    }
+    return totals, dict(days)
+
+
+def rebuild(dry_run=False):
+    """
+    Replace the rollup with freshly computed values.
+
+    Returns the new totals, the drift against the stored totals and the number
+    of daily buckets that differed.
+    """
+    with transaction.atomic():
+        totals, days = compute()
+        stored = CrmStats.objects.select_for_update().filter(pk=1).first()
+        drift = {
+            key: value - (getattr(stored, key) if stored else 0)
+            for key, value in totals.items()
+        }
+        existing = {
+            bucket.day: {'new_customers': bucket.new_customers, 'orders': bucket.orders, 'revenue': bucket.revenue}
+            for bucket in CrmDailyStats.objects.all()
+        }
+        changed_days = sum(
+            1 for day in set(existing) | set(days)
+            if existing.get(day) != days.get(day)
+        )
+        if not dry_run:
+            response_cache.invalidate(Customer, Order, OrderItem)
+            CrmStats.objects.update_or_create(pk=1, defaults=totals)
+            CrmDailyStats.objects.all().delete()
+            CrmDailyStats.objects.bulk_create(
+                [CrmDailyStats(day=day, **values) for day, values in days.items()],
+                batch_size=1000,
+            )
+    return {'totals': totals, 'drift': drift, 'changed_days': changed_days}
+
+
+# === Revenue by period ===
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _closed_days(date_from, date_to):
+    """The whole days of [date_from, date_to] before today, as a [first, end) range; None is unbounded."""
+    first = None
+    if date_from is not None:
+        first = timezone.localdate(date_from)
+        if date_from > _start_of(first):
+            first += timedelta(days=1)
+    end = timezone.localdate()
+    if date_to is not None:
+        end = min(end, timezone.localdate(date_to))
+    return first, end
+
+
+def _add(periods, rows):
+    for row in rows:
+        period = periods[row['period']]
+        period['orders'] += row['orders'] or 0
+        period['revenue'] += Decimal(row['revenue'] or 0).quantize(CENT)
+
+
+def revenue_by_period(granularity, date_from=None, date_to=None, status=None):
+    """
+    Orders and revenue per day, week or month of created_at, oldest first.
+
+    Returns dicts with period_start (the first day of the period), orders and
+    revenue. Without a status filter and with the rollup enabled, whole days
+    before today are summed from CrmDailyStats, so a closed month costs at
+    most one bucket row per day; only partial days at the edges of the range
+    and today are grouped from the orders. Status filters are not bucketed and
+    always group the orders, on the (status, created_at) index.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}.")
+    date_from, date_to = (
+        timezone.make_aware(value) if value is not None and timezone.is_naive(value) else value
+        for value in (date_from, date_to)
+    )
+    periods = defaultdict(lambda: {'orders': 0, 'revenue': Decimal('0')})
+    live = [{'created_at__gte': date_from, 'created_at__lte': date_to}]
+    if rollup_enabled() and not status:
+        first, end = _closed_days(date_from, date_to)
+        if first is None or first < end:
+            buckets = CrmDailyStats.objects.filter(day__lt=end)
+            if first is not None:
+                buckets = buckets.filter(day__gte=first)
+            _add(periods, (
+                buckets.order_by().annotate(period=Trunc('day', granularity, output_field=DateField()))
+                .values('period').annotate(orders=Sum('orders'), revenue=Sum('revenue'))
+            ))
+            live = [{'created_at__gte': _start_of(end), 'created_at__lte': date_to}]
+            if first is not None:
+                live.append({'created_at__gte': date_from, 'created_at__lt': _start_of(first)})
+    for bounds in live:
+        orders = Order.objects.filter(**{key: value for key, value in bounds.items() if value is not None})
+        if status:
+            orders = orders.filter(status=status)
+        _add(periods, (
+            orders.order_by().annotate(period=Trunc('created_at', granularity, output_field=DateField()))
+            .values('period').annotate(orders=Count('id', distinct=True), revenue=ORDER_REVENUE)
+        ))
+    return [
+        {'period_start': period, **values}
+        for period, values in sorted(periods.items())
+        if values['orders'] or values['revenue']
+    ]
@@ -1,38 +1,26 @@
 from celery import shared_task
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
 from datetime import datetime
 
-@shared_task
-def generate_crm_report():
-    transport = RequestsHTTPTransport(
-        url='http://localhost:8000/graphql/',
-        verify=True,
-        retries=3,
-    )
-
-    client = Client(transport=transport, fetch_schema_from_transport=False)
+from crm import reports
 
-    query = gql("""
-    query {
-        totalCustomers
-        totalOrders
-        totalRevenue
-    }
-    """)
 
+@shared_task
+def generate_crm_report():
     try:
-        result = client.execute(query)
+        # Adds the rows since the last snapshot to its totals (periodically a full recount).
+        snapshot = reports.take_snapshot()
 
         report = (
             f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Report: "
-            f"{result['totalCustomers']} customers, "
-            f"{result['totalOrders']} orders, "
-            f"{result['totalRevenue']} revenue\n"
+            f"{snapshot.total_customers} customers, "
+            f"{snapshot.total_orders} orders, "
+            f"{snapshot.total_revenue} revenue "
+            f"(+{snapshot.new_customers} customers, +{snapshot.new_orders} orders, "
+            f"+{snapshot.new_revenue} revenue{'; reconciled' if snapshot.full else ''})\n"
         )
 
     except Exception as e:
-        report = f"{datetime.now()} - GraphQL Error: {e}\n"
+        report = f"{datetime.now()} - Report Error: {e}\n"
 
     with open("/tmp/crm_report_log.txt", "a") as f:
         f.write(report)
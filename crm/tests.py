@@ -1,3 +1,1178 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections
+from django.db.models import Count
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gql.transport.exceptions import TransportQueryError
+from graphql import parse
+
+from graphql_crm.schema import schema
+
+from . import benchmarks, documents, graphql_client, importer, instrumentation, loaders, purge, reminders, reports, response_cache, search, stats
+from .models import CrmDailyStats, CrmStats, Customer, ImportCheckpoint, Order, OrderItem, OrderReminder, Product
+from .views import AsyncCrmGraphQLView
+
+
+def make_orders(count, prefix):
+    for n in range(count):
+        customer = Customer.objects.create(
+            first_name="Ada", last_name=f"{prefix}{n}", email=f"{prefix}{n}@example.com"
+        )
+        order = Order.objects.create(customer=customer, order_number=f"{prefix}-{n}")
+        for i in range(2):
+            OrderItem.objects.create(order=order, product_name=f"item {i}", quantity=1, price="9.99")
+
+
+class Context:
+    pass
+
+
+class RelationBatchingTests(TestCase):
+    QUERY = """
+    {
+        orders {
+            edges {
+                node {
+                    orderNumber
+                    customer { email orders { orderNumber } }
+                    items { productName order { orderNumber } }
+                }
+            }
+        }
+    }
+    """
+
+    def run_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(self.QUERY, context_value=Context())
+        self.assertIsNone(result.errors)
+        return [edge["node"] for edge in result.data["orders"]["edges"]], len(queries)
+
+    def test_query_count_is_constant_in_list_size(self):
+        make_orders(3, "small")
+        small_data, small_queries = self.run_query()
+        make_orders(30, "large")
+        large_data, large_queries = self.run_query()
+
+        self.assertEqual(len(small_data), 3)
+        self.assertEqual(len(large_data), 33)
+        self.assertEqual(small_queries, large_queries)
+        # orders, their customers, the customers' orders and the order items.
+        self.assertEqual(large_queries, 4)
+
+    def test_relations_resolve_to_the_right_parent(self):
+        make_orders(2, "rel")
+        data, _ = self.run_query()
+        for order in data:
+            self.assertEqual(order["customer"]["orders"], [{"orderNumber": order["orderNumber"]}])
+            self.assertEqual(len(order["items"]), 2)
+            for item in order["items"]:
+                self.assertEqual(item["order"]["orderNumber"], order["orderNumber"])
+
+
+class CustomerStatsTests(TestCase):
+    def test_with_stats_matches_per_row_properties(self):
+        make_orders(2, "stats")
+        customer = Customer.objects.first()
+        Order.objects.create(customer=customer, order_number="stats-extra", status="completed")
+        Order.objects.create(customer=customer, order_number="stats-extra2", status="completed")
+
+        for annotated in Customer.objects.with_stats():
+            plain = Customer.objects.get(pk=annotated.pk)
+            with self.assertNumQueries(0):
+                values = (
+                    annotated.is_active, annotated.order_count, annotated.last_order_date,
+                    annotated.has_orders, annotated.completed_order_count,
+                )
+            self.assertEqual(values, (
+                plain.is_active, plain.order_count, plain.last_order_date,
+                plain.has_orders, plain.completed_order_count,
+            ))
+        for order in Order.objects.with_stats():
+            self.assertEqual(order.is_returning_customer, order.customer.completed_order_count > 1)
+
+    def test_customer_list_stats_cost_one_query(self):
+        make_orders(10, "page")
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(
+                "{ customers { edges { node { email isActive orderCount lastOrderDate hasOrders } } } }",
+                context_value=Context(),
+            )
+        self.assertIsNone(result.errors)
+        customers = [edge["node"] for edge in result.data["customers"]["edges"]]
+        self.assertEqual(len(customers), 10)
+        self.assertTrue(all(c["isActive"] and c["orderCount"] == 1 for c in customers))
+        self.assertEqual(len(queries), 1)
+
+
+class TotalRevenueTests(TestCase):
+    QUERY = (
+        "query($from: DateTime, $to: DateTime, $customer: ID, $status: String) "
+        "{ totalRevenue(from: $from, to: $to, customerId: $customer, status: $status) }"
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.now = timezone.now()
+        self.ada = Customer.objects.create(first_name="Ada", last_name="Revenue", email="ada.revenue@example.com")
+        self.bo = Customer.objects.create(first_name="Bo", last_name="Revenue", email="bo.revenue@example.com")
+        old = Order.objects.create(customer=self.ada, order_number="rev-old", created_at=self.now - timedelta(days=10))
+        new = Order.objects.create(customer=self.ada, order_number="rev-new", status="completed")
+        other = Order.objects.create(customer=self.bo, order_number="rev-other")
+        OrderItem.objects.create(order=old, product_name="a", quantity=2, price=Decimal("5.00"))
+        OrderItem.objects.create(order=new, product_name="b", quantity=1, price=Decimal("7.50"))
+        OrderItem.objects.create(order=other, product_name="c", quantity=3, price=Decimal("1.00"))
+
+    def revenue(self, **variables):
+        result = schema.execute(self.QUERY, variable_values=variables, context_value=Context())
+        self.assertIsNone(result.errors)
+        return result.data["totalRevenue"]
+
+    def test_unfiltered(self):
+        self.assertEqual(self.revenue(), 20.5)
+
+    def test_date_range(self):
+        cutoff = (self.now - timedelta(days=5)).isoformat()
+        self.assertEqual(self.revenue(**{"from": cutoff}), 10.5)
+        self.assertEqual(self.revenue(to=cutoff), 10.0)
+        window = {"from": (self.now - timedelta(days=11)).isoformat(), "to": (self.now - timedelta(days=9)).isoformat()}
+        self.assertEqual(self.revenue(**window), 10.0)
+
+    def test_customer(self):
+        self.assertEqual(self.revenue(customer=str(self.ada.pk)), 17.5)
+        self.assertEqual(self.revenue(customer=str(self.bo.pk)), 3.0)
+        self.assertEqual(self.revenue(customer=str(self.ada.pk), status="completed"), 7.5)
+        self.assertEqual(
+            self.revenue(customer=str(self.ada.pk), to=(self.now - timedelta(days=5)).isoformat()), 10.0
+        )
+
+
+class StatsRollupTests(TestCase):
+    def assertRollupMatchesTables(self):
+        totals, days = stats.compute()
+        self.assertEqual(stats.totals(), totals)
+        buckets = {
+            bucket.day: {"new_customers": bucket.new_customers, "orders": bucket.orders, "revenue": bucket.revenue}
+            for bucket in CrmDailyStats.objects.all()
+            # Buckets whose rows were all deleted stay behind as zeroes.
+            if bucket.new_customers or bucket.orders or bucket.revenue
+        }
+        self.assertEqual(buckets, {day: values for day, values in days.items() if any(values.values())})
+
+    def test_signals_follow_saves_and_deletes(self):
+        customer = Customer.objects.create(first_name="Ada", last_name="Rollup", email="rollup@example.com")
+        spare = Customer.objects.create(first_name="Bo", last_name="Spare", email="spare@example.com")
+        old = Order.objects.create(customer=customer, order_number="old", created_at=timezone.now() - timedelta(days=40))
+        new = Order.objects.create(customer=customer, order_number="new", status="completed")
+        item = OrderItem.objects.create(order=old, product_name="a", quantity=2, price=Decimal("5.00"))
+        OrderItem.objects.create(order=new, product_name="b", quantity=1, price=Decimal("7.50"))
+        self.assertRollupMatchesTables()
+
+        item = OrderItem.objects.get(pk=item.pk)
+        item.quantity = 3
+        item.save()
+        item.order = new
+        item.save()
+        self.assertRollupMatchesTables()
+
+        new.delete()
+        spare.delete()
+        self.assertRollupMatchesTables()
+
+    def test_bulk_paths_record_their_rows(self):
+        make_orders(2, "bulk")
+        customer = Customer.objects.first()
+        orders = stats.bulk_create([
+            Order(customer=customer, order_number=f"back-{n}", created_at=timezone.now() - timedelta(days=n * 30))
+            for n in range(1, 3)
+        ])
+        stats.bulk_create([
+            OrderItem(order_id=order.pk, product_name="x", quantity=n + 1, price=Decimal("2.50"))
+            for n, order in enumerate(orders)
+        ])
+        schema.execute(
+            "mutation { bulkCreateCustomers(input: [{name: \"Cy Bulk\", email: \"cy@example.com\"}]) { errors } }",
+            context_value=Context(),
+        )
+        self.assertRollupMatchesTables()
+
+        Order.objects.filter(order_number="back-1").update(status="completed")
+        Order.objects.filter(order_number__startswith="back-").guarded_delete()
+        Customer.objects.filter(email="cy@example.com").guarded_delete()
+        self.assertRollupMatchesTables()
+
+    def test_changing_created_at_moves_the_day(self):
+        make_orders(2, "moved")
+        order = Order.objects.get(order_number="moved-0")
+        order.created_at -= timedelta(days=3)
+        order.save()
+        customer = Customer.objects.get(email="moved1@example.com")
+        customer.created_at -= timedelta(days=5)
+        customer.save()
+        self.assertRollupMatchesTables()
+        self.assertEqual(stats.rebuild(dry_run=True)["changed_days"], 0)
+
+        # A save that leaves created_at out of update_fields keeps the stored day,
+        # and so does deleting the instance afterwards.
+        order.created_at += timedelta(days=1)
+        order.status = "completed"
+        order.save(update_fields=["status"])
+        self.assertRollupMatchesTables()
+        order.delete()
+        self.assertRollupMatchesTables()
+
+    def test_first_bulk_write_builds_the_rollup_once(self):
+        self.assertFalse(CrmStats.objects.exists())
+        stats.bulk_create([
+            Customer(first_name="Ada", last_name=f"Day{n}", email=f"day{n}@example.com",
+                     created_at=timezone.now() - timedelta(days=n))
+            for n in range(3)
+        ])
+        self.assertRollupMatchesTables()
+        CrmStats.objects.all().delete()
+        stats.subtract(customers=Customer.objects.filter(email="day1@example.com"))
+        Customer.objects.filter(email="day1@example.com").delete()
+        self.assertEqual(stats.totals()["total_customers"], 2)
+
+    def test_rebuild_repairs_drift(self):
+        make_orders(2, "drift")
+        CrmStats.objects.filter(pk=1).update(total_orders=99)
+        CrmDailyStats.objects.all().delete()
+        result = stats.rebuild(dry_run=True)
+        self.assertEqual(result["drift"]["total_orders"], -97)
+        self.assertEqual(CrmStats.objects.get(pk=1).total_orders, 99)
+        stats.rebuild()
+        self.assertRollupMatchesTables()
+
+
+class KeysetPaginationTests(TestCase):
+    def collect(self, field, fields, page_size, backwards=False):
+        nodes, cursor, pages = [], None, 0
+        while True:
+            if backwards:
+                args = f"last: {page_size}" + (f', before: "{cursor}"' if cursor else "")
+            else:
+                args = f"first: {page_size}" + (f', after: "{cursor}"' if cursor else "")
+            result = schema.execute(
+                f"{{ {field}({args}) {{ edges {{ node {{ {fields} }} }} "
+                "pageInfo { startCursor endCursor hasNextPage hasPreviousPage } } }",
+                context_value=Context(),
+            )
+            self.assertIsNone(result.errors)
+            connection = result.data[field]
+            page = [edge["node"] for edge in connection["edges"]]
+            pages += 1
+            if backwards:
+                nodes = page + nodes
+                if not connection["pageInfo"]["hasPreviousPage"]:
+                    return nodes, pages
+                cursor = connection["pageInfo"]["startCursor"]
+            else:
+                nodes += page
+                if not connection["pageInfo"]["hasNextPage"]:
+                    return nodes, pages
+                cursor = connection["pageInfo"]["endCursor"]
+
+    def test_pages_follow_meta_ordering_without_gaps(self):
+        for n in range(7):
+            # Duplicate names exercise the id tie-breaker.
+            Customer.objects.create(first_name="Sam", last_name=f"Lee{n % 3}", email=f"lee{n}@example.com")
+        expected = list(Customer.objects.values_list("email", flat=True))
+
+        forward, pages = self.collect("customers", "email", 3)
+        self.assertEqual([c["email"] for c in forward], expected)
+        self.assertEqual(pages, 3)
+        backward, _ = self.collect("customers", "email", 2, backwards=True)
+        self.assertEqual([c["email"] for c in backward], expected)
+
+    def test_descending_ordering(self):
+        make_orders(5, "desc")
+        expected = list(Order.objects.values_list("order_number", flat=True))
+        forward, _ = self.collect("orders", "orderNumber", 2)
+        self.assertEqual([o["orderNumber"] for o in forward], expected)
+
+    def test_customer_page_with_stats_walks_the_index(self):
+        make_orders(3, "plan")
+        first = self.plan("{ customers(first: 1) { pageInfo { endCursor } } }")
+        cursor = first["data"]["customers"]["pageInfo"]["endCursor"]
+        # A page deep into the connection seeks to its cursor the same way as the first one.
+        for page in ("", f', after: "{cursor}"'):
+            with self.subTest(page=page):
+                result = self.plan(
+                    f"{{ customers(first: 2{page}) {{ edges {{ node {{ email isActive orderCount lastOrderDate }} }} }} }}"
+                )
+                # The stats are per-row subqueries: no GROUP BY or sort over every customer before the LIMIT.
+                self.assertNotIn("TEMP B-TREE", result["plan"])
+                self.assertIn("crm_customer_name_idx", result["plan"])
+
+    def plan(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(query, context_value=Context())
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+        return {"data": result.data, "plan": plan}
+
+    def test_page_size_is_capped(self):
+        result = schema.execute("{ products(first: 1000) { edges { node { id } } } }", context_value=Context())
+        self.assertIn("exceeds the `first` limit", result.errors[0].message)
+
+    def test_invalid_cursor(self):
+        result = schema.execute('{ products(after: "nope") { edges { node { id } } } }', context_value=Context())
+        self.assertIn("Invalid cursor", result.errors[0].message)
+
+
+class SeedTests(TestCase):
+    options = dict(customers=12, products=0, seed=7, chunk_size=5, workers=1, end="2025-01-01", verbosity=0)
+
+    def seed(self, **options):
+        call_command("seed", stdout=StringIO(), **{**self.options, **options})
+
+    def snapshot(self):
+        return (
+            list(Customer.objects.order_by("email").values_list("email", "first_name", "last_name", "phone_number", "created_at")),
+            list(Order.objects.order_by("order_number").values_list("order_number", "customer__email", "status", "created_at")),
+            list(OrderItem.objects.order_by("order__order_number", "product_name", "quantity", "price")
+                 .values_list("order__order_number", "product_name", "quantity", "price")),
+        )
+
+    def test_same_seed_gives_the_same_data(self):
+        self.seed()
+        first = self.snapshot()
+        self.seed(replace=True)
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(len(first[0]), 12)
+        self.assertEqual(stats.totals(), stats.compute()[0])
+        self.assertEqual(stats.totals()["total_customers"], 12)
+
+    def test_existing_seed_needs_replace(self):
+        self.seed()
+        with self.assertRaisesMessage(CommandError, "Seed 7 is already in the database"):
+            self.seed()
+        self.seed(seed=8)
+        self.assertEqual(Customer.objects.count(), 24)
+
+    def test_distribution_options_as_strings(self):
+        self.seed(orders_per_customer="3", items_per_order="1-2")
+        self.assertEqual(Order.objects.count(), 36)
+        self.assertTrue(OrderItem.objects.exists())
+        self.assertFalse(OrderItem.objects.values("order").annotate(n=Count("id")).filter(n__gt=2).exists())
+
+
+class BenchmarkBudgetTests(TestCase):
+    """The committed per-operation query budgets hold on a small seeded dataset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("seed", customers=60, products=60, workers=1, verbosity=0, stdout=StringIO())
+
+    def test_every_operation_has_a_budget(self):
+        self.assertEqual(set(benchmarks.load_budgets()), set(benchmarks.OPERATIONS))
+
+    def test_query_budgets(self):
+        budgets = benchmarks.load_budgets()
+        for name in benchmarks.OPERATIONS:
+            with self.subTest(operation=name):
+                measurement = benchmarks.measure(name, repeat=1, warmup=0)
+                self.assertEqual(benchmarks.check(measurement, budgets), [])
+
+    def test_cached_reports_are_measured_on_their_queries(self):
+        self.addCleanup(cache.clear)
+        for name in ("totalCustomers", "totalRevenue"):
+            with self.subTest(operation=name):
+                measurement = benchmarks.measure(name, repeat=2, warmup=1)
+                self.assertEqual(measurement.queries, 1)
+                self.assertEqual(benchmarks.execute(name)[1], 1)
+
+
+@override_settings(CRM_GRAPHQL_INSTRUMENTATION=True, CRM_GRAPHQL_N_PLUS_ONE_THRESHOLD=2)
+class InstrumentationTests(TestCase):
+    QUERY = "{ orders { edges { node { orderNumber customer { email } } } } }"
+
+    @override_settings(DEBUG=True)
+    def test_debug_header_adds_report_to_extensions(self):
+        make_orders(3, "inst")
+        response = self.client.post(
+            "/graphql", {"query": self.QUERY}, content_type="application/json",
+            headers={instrumentation.DEBUG_HEADER: "1"},
+        )
+        report = response.json()["extensions"]["instrumentation"]
+        self.assertEqual(report["queries"], 2)
+        self.assertEqual(report["resolvers"]["orders"]["queries"], 1)
+        customer = report["resolvers"]["orders.edges.node.customer"]
+        self.assertEqual((customer["calls"], customer["queries"]), (3, 1))
+        self.assertEqual(report["n_plus_one"], [])
+
+    def test_report_is_logged_without_header(self):
+        make_orders(1, "log")
+        with self.assertLogs("crm.instrumentation", "INFO") as logs:
+            response = self.client.post("/graphql", {"query": self.QUERY}, content_type="application/json")
+        self.assertNotIn("instrumentation", response.json()["extensions"])
+        self.assertIn('"event": "graphql.request"', logs.output[0])
+
+    def test_repeated_sql_shape_is_flagged(self):
+        recorder = instrumentation.Recorder()
+        token = instrumentation._current_path.set("customers.edges.node.orders")
+        self.addCleanup(instrumentation._current_path.reset, token)
+        for n in range(3):
+            sql = "SELECT * FROM crm_order WHERE customer_id IN (%s)" if n else \
+                "SELECT * FROM crm_order WHERE customer_id IN (%s, %s)"
+            recorder(lambda *args: None, sql, (n,), False, {})
+        [suspect] = recorder.n_plus_one()
+        self.assertEqual(suspect["count"], 3)
+        self.assertEqual(suspect["paths"], {"customers.edges.node.orders": 3})
+
+
+@override_settings(CRM_GRAPHQL_INSTRUMENTATION=False)
+class PersistedQueryTests(TestCase):
+    QUERY = "{ totalCustomers }"
+
+    def setUp(self):
+        documents.documents.clear()
+        cache.clear()
+
+    def post(self, query=None, sha256=None):
+        body = {"query": query} if query else {}
+        if sha256:
+            body["extensions"] = {"persistedQuery": {"version": 1, "sha256Hash": sha256}}
+        return self.client.post("/graphql", body, content_type="application/json").json()
+
+    def test_repeated_query_is_parsed_once(self):
+        with mock.patch("crm.views.parse", wraps=parse) as parse_spy:
+            for _ in range(3):
+                self.assertEqual(self.post(self.QUERY)["data"], {"totalCustomers": 0})
+        self.assertEqual(parse_spy.call_count, 1)
+
+    def test_invalid_documents_are_not_cached(self):
+        for _ in range(2):
+            self.assertIn("errors", self.post("{ noSuchField }"))
+        self.assertEqual(len(documents.documents), 0)
+
+    def test_automatic_persisted_query_round_trip(self):
+        sha256 = documents.query_hash(self.QUERY)
+        error = self.post(sha256=sha256)["errors"][0]
+        self.assertEqual(error["message"], "PersistedQueryNotFound")
+        self.assertEqual(error["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND")
+        self.assertEqual(self.post(self.QUERY, sha256)["data"], {"totalCustomers": 0})
+        self.assertEqual(self.post(sha256=sha256)["data"], {"totalCustomers": 0})
+        self.assertIn("does not match", self.post("{ totalOrders }", sha256)["errors"][0]["message"])
+
+    def test_strict_mode_only_runs_registered_queries(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as manifest:
+            json.dump({documents.query_hash(self.QUERY): self.QUERY}, manifest)
+            manifest.flush()
+            with self.settings(CRM_GRAPHQL_PERSISTED_QUERIES="strict",
+                               CRM_GRAPHQL_PERSISTED_QUERIES_MANIFEST=manifest.name):
+                self.assertEqual(self.post(self.QUERY)["data"], {"totalCustomers": 0})
+                self.assertEqual(self.post(sha256=documents.query_hash(self.QUERY))["data"], {"totalCustomers": 0})
+                error = self.post("{ totalOrders }")["errors"][0]
+                self.assertEqual(error["extensions"]["code"], "PERSISTED_QUERY_NOT_ALLOWED")
+
+
+@override_settings(CRM_GRAPHQL_INSTRUMENTATION=False, CRM_GRAPHQL_MAX_DEPTH=8, CRM_GRAPHQL_MAX_COST=1000)
+class QueryCostTests(TestCase):
+    def post(self, query):
+        return self.client.post("/graphql", {"query": query}, content_type="application/json")
+
+    def test_cost_is_reported(self):
+        response = self.post("{ customers(first: 50) { edges { node { orders { items { productName } } } } } }")
+        # customers + edges + 50 nodes + 50 order lists + 50 * 10 item lists.
+        self.assertEqual(response.json()["extensions"]["cost"]["requested"], 602)
+        self.assertEqual(response.json()["extensions"]["cost"]["depth"], 6)
+
+    def test_page_size_variables_are_used(self):
+        query = "query($n: Int) { products(first: $n) { edges { node { name } } } }"
+        response = self.client.post(
+            "/graphql", {"query": query, "variables": {"n": 5}}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["extensions"]["cost"]["requested"], 7)
+
+    def test_search_is_costed_by_its_first_argument(self):
+        # searchCustomers + one order list per requested match.
+        for first, requested in ((3, 4), (40, 41)):
+            with self.subTest(first=first):
+                response = self.post(f'{{ searchCustomers(query: "ada", first: {first}) {{ email orders {{ id }} }} }}')
+                self.assertEqual(response.json()["extensions"]["cost"]["requested"], requested)
+        response = self.post('{ searchCustomers(query: "ada") { email orders { id } } }')
+        self.assertEqual(response.json()["extensions"]["cost"]["requested"], 1 + search.DEFAULT_RESULTS)
+
+    def test_empty_page_costs_no_items(self):
+        response = self.post("{ products(first: 0) { edges { node { name } } } }")
+        self.assertEqual(response.json()["extensions"]["cost"]["requested"], 2)
+
+    def test_deep_nesting_is_rejected_before_execution(self):
+        query = "{ customers { edges { node { orders { items { order { customer { orders { id } } } } } } } } }"
+        with self.assertNumQueries(0):
+            response = self.post(query)
+        self.assertEqual(response.status_code, 400)
+        error = response.json()["errors"][0]
+        self.assertEqual(error["extensions"]["code"], "QUERY_TOO_DEEP")
+        self.assertEqual(error["extensions"]["cost"]["depth"], 9)
+
+    def test_costly_query_is_rejected(self):
+        response = self.post("{ customers(first: 100) { edges { node { orders { items { productName } } } } } }")
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "QUERY_TOO_COSTLY")
+
+    @override_settings(CRM_GRAPHQL_COST_PER_MINUTE=5)
+    def test_clients_are_throttled_by_cost_per_minute(self):
+        self.addCleanup(cache.clear)
+        cache.clear()
+        self.assertEqual(self.post("{ totalCustomers totalOrders totalRevenue }").status_code, 200)
+        self.assertEqual(self.post("{ totalCustomers totalOrders }").json()["extensions"]["cost"]["remainingPerMinute"], 0)
+        response = self.post("{ totalCustomers }")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "RATE_LIMITED")
+
+
+class UpdateLowStockTests(TestCase):
+    MUTATION = "mutation { updateLowStockProducts(threshold: 5, increment: 10) { message updatedProducts { name stock } } }"
+
+    def test_reports_only_rows_this_run_restocked(self):
+        first = Product.objects.create(name="Raced", price=Decimal("1.00"), stock=1)
+        Product.objects.create(name="Ours", price=Decimal("1.00"), stock=2)
+        Product.objects.create(name="Stocked", price=Decimal("1.00"), stock=50)
+        now = timezone.now
+
+        def overlapping_run():
+            # Another run restocks one locked product between our SELECT and UPDATE.
+            Product.objects.filter(pk=first.pk).update(stock=11)
+            return now()
+
+        with mock.patch("crm.schema.timezone.now", side_effect=overlapping_run):
+            result = schema.execute(self.MUTATION, context_value=Context())
+        self.assertIsNone(result.errors)
+        payload = result.data["updateLowStockProducts"]
+        self.assertEqual(payload["message"], "1 product(s) restocked.")
+        self.assertEqual(payload["updatedProducts"], [{"name": "Ours", "stock": 12}])
+        self.assertEqual(Product.objects.get(pk=first.pk).stock, 11)
+
+
+class BulkCreateCustomersTests(TestCase):
+    MUTATION = "mutation($input: [CreateCustomerInput]!) { bulkCreateCustomers(input: $input) { customers { email } errors } }"
+
+    def bulk_create(self, entries):
+        result = schema.execute(self.MUTATION, variable_values={"input": entries}, context_value=Context())
+        return result, (result.data or {}).get("bulkCreateCustomers")
+
+    def test_per_entry_errors_and_batch_duplicates(self):
+        Customer.objects.create(first_name="Old", last_name="Timer", email="taken@example.com")
+        _result, payload = self.bulk_create([
+            {"name": "Ann Lee", "email": "ann@example.com"},
+            {"name": "Ann Again", "email": "ann@example.com"},
+            {"name": "Bad Phone", "email": "phone@example.com", "phone": "12"},
+            {"name": "Old Timer", "email": "taken@example.com"},
+            {"name": "Bo Chan", "email": "bo@example.com", "phone": "+12345678901"},
+        ])
+        self.assertEqual([c["email"] for c in payload["customers"]], ["ann@example.com", "bo@example.com"])
+        self.assertEqual(payload["errors"], [
+            "Entry 1: ['Email already exists.']",
+            "Entry 2: ['Invalid phone format.']",
+            "Entry 3: ['Email already exists.']",
+        ])
+        self.assertEqual(stats.totals()["total_customers"], 3)
+
+    def test_conflicts_at_insert_time_are_reported_per_entry(self):
+        Customer.objects.create(first_name="Racer", last_name="Won", email="raced@example.com")
+        real_bulk_create = Customer.objects.bulk_create
+
+        def bulk_create(objs, *args, **kwargs):
+            if any(obj.email == "check@example.com" for obj in objs):
+                raise IntegrityError("CHECK constraint failed: crm_customer")
+            return real_bulk_create(objs, *args, **kwargs)
+
+        # The pre-fetch misses the concurrent writer of raced@example.com.
+        with mock.patch("alx_backend_graphql_crm.schema.existing_emails", return_value=set()), \
+                mock.patch.object(Customer.objects, "bulk_create", side_effect=bulk_create):
+            _result, payload = self.bulk_create([
+                {"name": "Ann Lee", "email": "ann@example.com"},
+                {"name": "Racer Lost", "email": "raced@example.com"},
+                {"name": "Check Failed", "email": "check@example.com"},
+            ])
+        self.assertEqual([c["email"] for c in payload["customers"]], ["ann@example.com"])
+        self.assertEqual(payload["errors"], [
+            "Entry 1: ['Email already exists.']",
+            "Entry 2: CHECK constraint failed: crm_customer",
+        ])
+
+    def test_unexpected_error_rolls_back_the_whole_batch(self):
+        real_bulk_create = Customer.objects.bulk_create
+        calls = []
+
+        def bulk_create(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise RuntimeError("disk full")
+            return real_bulk_create(objs, *args, **kwargs)
+
+        with mock.patch("alx_backend_graphql_crm.schema.BULK_CREATE_BATCH_SIZE", 1), \
+                mock.patch.object(Customer.objects, "bulk_create", side_effect=bulk_create):
+            result, _payload = self.bulk_create([
+                {"name": "Ann Lee", "email": "ann@example.com"},
+                {"name": "Bo Chan", "email": "bo@example.com"},
+            ])
+        self.assertEqual(result.errors[0].message, "disk full")
+        self.assertFalse(Customer.objects.exists())
+
+
+class ImportTests(TestCase):
+    def customer_lines(self, count):
+        return [
+            json.dumps({"name": f"Imported Person{n}", "email": f"imported{n}@example.com"}) for n in range(count)
+        ]
+
+    def test_interrupted_import_resumes_after_the_last_batch(self):
+        data = "\n".join(self.customer_lines(5))
+
+        class Crash(Exception):
+            pass
+
+        def crash_after_first_batch(result):
+            raise Crash
+
+        with self.assertRaises(Crash):
+            importer.import_stream(
+                "customers", StringIO(data), "jsonl", source="export.jsonl", batch_size=2,
+                progress=crash_after_first_batch,
+            )
+        checkpoint = ImportCheckpoint.objects.get(source="export.jsonl", kind="customers")
+        self.assertEqual((checkpoint.rows_processed, checkpoint.rows_imported, checkpoint.completed_at), (2, 2, None))
+
+        result = importer.import_stream("customers", StringIO(data), "jsonl", source="export.jsonl", batch_size=2)
+        self.assertEqual((result.skipped, result.processed, result.imported), (2, 3, 3))
+        self.assertEqual(Customer.objects.count(), 5)
+        self.assertEqual(stats.totals()["total_customers"], 5)
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.rows_processed, checkpoint.rows_imported), (5, 5))
+        self.assertIsNotNone(checkpoint.completed_at)
+
+    def test_malformed_lines_are_reported_as_row_errors(self):
+        good = self.customer_lines(2)
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as fh:
+            fh.write("\n".join([good[0], "{not json", "[1, 2]", good[1]]))
+        self.addCleanup(os.unlink, fh.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_crm", "customers", fh.name, stdout=out, stderr=err)
+        self.assertIn("Row 2: Invalid JSON", err.getvalue())
+        self.assertIn("Row 3: Expected an object.", err.getvalue())
+        self.assertIn("Imported 2 customers, 2 row(s) failed.", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 2)
+
+
+class ResponseCacheTests(TestCase):
+    QUERY = "{ totalCustomers totalOrders totalRevenue }"
+
+    def setUp(self):
+        cache.clear()
+
+    def totals(self):
+        result = schema.execute(self.QUERY, context_value=Context())
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_hits_skip_the_database_and_writes_invalidate_affected_fields(self):
+        make_orders(1, "cache")
+        self.assertEqual(self.totals(), {"totalCustomers": 1, "totalOrders": 1, "totalRevenue": 19.98})
+        with self.assertNumQueries(0):
+            self.totals()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(first_name="New", last_name="Customer", email="new@example.com")
+        # Only totalCustomers is recomputed.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.totals()["totalCustomers"], 2)
+
+    def test_invalidation_waits_for_commit(self):
+        self.totals()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Customer.objects.create(first_name="Un", last_name="Committed", email="un@example.com")
+            self.assertEqual(self.totals()["totalCustomers"], 0)
+        self.assertTrue(callbacks)
+
+    def test_concurrent_misses_are_coalesced(self):
+        calls = []
+        cache.add("crm:rc:test:lock", 1)
+
+        def compute():
+            calls.append(1)
+            return 42
+
+        # Another worker holds the lock and publishes its result shortly.
+        with mock.patch.object(response_cache.time, "sleep", lambda _: cache.set("crm:rc:test", 7)):
+            self.assertEqual(response_cache.get_or_compute("crm:rc:test", compute, 60), 7)
+        self.assertEqual(calls, [])
+
+
+@override_settings(CRM_GRAPHQL_INSTRUMENTATION=False, CRM_GRAPHQL_MAX_BATCH_SIZE=3)
+class BatchRequestTests(TestCase):
+    ORDERS = "{ orders { edges { node { customer { email } } } } }"
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, body):
+        return self.client.post("/graphql", body, content_type="application/json")
+
+    def test_results_keep_order_and_errors_stay_per_operation(self):
+        response = self.post([
+            {"id": "a", "query": "{ totalCustomers }"},
+            {"id": "b", "query": "{ noSuchField }"},
+            {"id": "c"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        a, b, c = response.json()
+        self.assertEqual((a["id"], a["status"], a["data"]), ("a", 200, {"totalCustomers": 0}))
+        self.assertEqual((b["id"], b["status"]), ("b", 400))
+        self.assertIn("noSuchField", b["errors"][0]["message"])
+        self.assertEqual((c["id"], c["status"], c["errors"][0]["message"]), ("c", 400, "Must provide query string."))
+
+    def test_operations_share_loaders_until_a_mutation(self):
+        make_orders(3, "batch")
+        mutation = 'mutation { createCustomer(input: {name: "Bo Batch", email: "bo@example.com"}) { message } }'
+        with CaptureQueriesContext(connection) as queries:
+            responses = self.post([{"query": self.ORDERS}, {"query": self.ORDERS}]).json()
+        self.assertEqual(responses[0]["data"], responses[1]["data"])
+        # The second operation finds the customers already loaded.
+        self.assertEqual(len(queries), 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.post([{"query": self.ORDERS}, {"query": mutation}, {"query": self.ORDERS}])
+        self.assertGreater(len([q for q in queries if 'FROM "crm_customer"' in q["sql"]]), 1)
+
+    def test_batch_size_is_capped(self):
+        response = self.post([{"query": "{ totalOrders }"}] * 4)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("maximum of 3", response.json()["errors"][0]["message"])
+
+
+class JobClientTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        graphql_client.reset()
+        self.addCleanup(graphql_client.reset)
+
+    @mock.patch("crm.graphql_client.http_transport")
+    def test_queries_run_in_process(self, http):
+        make_orders(2, "job")
+        data = graphql_client.execute_query(
+            "query Totals($status: String) { totalOrders totalRevenue(status: $status) }", {"status": "active"}
+        )
+        self.assertEqual(data, {"totalOrders": 2, "totalRevenue": 39.96})
+        http.assert_not_called()
+
+    def test_errors_are_raised_like_http_errors(self):
+        with self.assertRaises(TransportQueryError) as raised:
+            graphql_client.execute_query("{ noSuchField }")
+        self.assertIn("noSuchField", raised.exception.errors[0]["message"])
+
+    def test_calls_share_one_session(self):
+        with mock.patch("crm.graphql_client.get_client", wraps=graphql_client.get_client) as get_client:
+            graphql_client.execute_query("{ totalCustomers }")
+            graphql_client.execute_query("{ totalOrders }")
+        self.assertEqual(get_client.call_count, 1)
+
+    def test_remote_schema_is_introspected_once_per_version(self):
+        introspection = graphql_client.LocalSchemaTransport().execute(
+            parse(graphql_client.get_introspection_query())
+        )
+        transport = mock.Mock()
+        transport.execute.return_value = introspection
+        with tempfile.TemporaryDirectory() as cache_dir, self.settings(CRM_GRAPHQL_SCHEMA_CACHE_DIR=cache_dir):
+            for _ in range(2):
+                self.assertIn("totalOrders", graphql_client.remote_schema(transport).query_type.fields)
+            with self.settings(CRM_GRAPHQL_SCHEMA_VERSION="next"):
+                graphql_client.remote_schema(transport)
+        self.assertEqual(transport.execute.call_count, 2)
+
+    @mock.patch("crm.graphql_client.http_transport")
+    def test_auto_mode_falls_back_to_http(self, http):
+        with mock.patch.object(graphql_client.connection, "ensure_connection", side_effect=RuntimeError("down")):
+            with self.assertLogs("crm.graphql_client", "WARNING"):
+                self.assertIs(graphql_client.get_transport(), http.return_value)
+            with override_settings(CRM_GRAPHQL_JOB_TRANSPORT="local"), self.assertRaises(RuntimeError):
+                graphql_client.get_transport()
+        with override_settings(CRM_GRAPHQL_JOB_TRANSPORT="http"):
+            self.assertIs(graphql_client.get_transport(), http.return_value)
+
+
+class PurgeInactiveCustomersTests(TestCase):
+    def customer(self, name, *orders):
+        customer = Customer.objects.create(first_name="Pat", last_name=name, email=f"{name}@example.com")
+        for n, (days_ago, status) in enumerate(orders):
+            order = Order.objects.create(
+                customer=customer, order_number=f"{name}-{n}", status=status,
+                created_at=timezone.now() - timedelta(days=days_ago),
+            )
+            OrderItem.objects.create(order=order, product_name="thing", quantity=2, price="5.00")
+        return customer
+
+    def setUp(self):
+        for n in range(3):
+            self.customer(f"lapsed{n}", (400, "completed"), (500, "cancelled"))
+        self.customer("recent", (400, "completed"), (10, "completed"))
+        self.customer("open", (400, "active"))
+        self.customer("never")
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command("purge_inactive_customers", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_counts(self):
+        output = self.purge("--dry-run")
+        self.assertIn("would delete 3 customers, 6 orders, 6 items", output)
+        self.assertEqual(Customer.objects.count(), 6)
+
+    def test_purges_in_chunks_and_keeps_rollup_exact(self):
+        stats.rebuild()
+        output = self.purge("--batch-size", "2")
+        self.assertIn("Chunk 2: 3 customers, 6 orders, 6 items so far", output)
+        self.assertEqual(
+            sorted(Customer.objects.values_list("last_name", flat=True)), ["never", "open", "recent"]
+        )
+        self.assertFalse(OrderItem.objects.filter(order__customer__last_name__startswith="lapsed").exists())
+        drift = stats.rebuild(dry_run=True)["drift"]
+        self.assertEqual(drift, {"total_customers": 0, "total_orders": 0, "total_revenue": 0})
+
+    def test_customer_who_ordered_since_the_chunk_was_picked_is_kept(self):
+        lapsed = Customer.objects.get(last_name="lapsed0")
+        Order.objects.create(customer=lapsed, order_number="lapsed0-new")
+        self.assertEqual(purge.purge_chunk([lapsed.pk], timezone.now() - timedelta(days=365)), (0, 0, 0))
+
+
+class GuardedDeleteTests(TestCase):
+    def setUp(self):
+        make_orders(4, "guard")
+        orders = list(Order.objects.order_by("order_number"))
+        for order, status in zip(orders, ["active", "completed", "cancelled", "cancelled"]):
+            order.status = status
+            order.save()
+        Customer.objects.create(first_name="No", last_name="Orders", email="none@example.com")
+        stats.rebuild()
+
+    def assertRollupExact(self):
+        drift = stats.rebuild(dry_run=True)["drift"]
+        self.assertEqual(drift, {"total_customers": 0, "total_orders": 0, "total_revenue": 0})
+
+    def test_customers_with_orders_are_refused(self):
+        self.assertEqual(Customer.objects.guarded_delete(), (1, 4))
+        self.assertFalse(Customer.objects.filter(email="none@example.com").exists())
+        self.assertRollupExact()
+
+    def test_active_orders_are_refused_and_items_cascade(self):
+        self.assertEqual(Order.objects.guarded_delete(), (3, 1))
+        self.assertEqual(list(Order.objects.values_list("status", flat=True)), ["active"])
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertRollupExact()
+
+    def test_items_of_completed_orders_are_refused(self):
+        with self.assertNumQueries(9):
+            # COUNT, the revenue aggregate by day, two rollup UPDATEs and one DELETE,
+            # plus two savepoints; no row is loaded.
+            self.assertEqual(OrderItem.objects.guarded_delete(), (6, 2))
+        self.assertEqual(set(OrderItem.objects.values_list("order__status", flat=True)), {"completed"})
+        self.assertRollupExact()
+
+    def test_products_in_stock_are_refused(self):
+        Product.objects.create(name="Empty", price=1, stock=0)
+        Product.objects.create(name="Stocked", price=1, stock=3)
+        self.assertEqual(Product.objects.guarded_delete(), (1, 1))
+        self.assertEqual(list(Product.objects.values_list("name", flat=True)), ["Stocked"])
+
+
+@override_settings(CRM_REPORT_RECONCILE_EVERY=2)
+class ReportSnapshotTests(TestCase):
+    def test_incremental_runs_only_add_new_rows(self):
+        make_orders(2, "week1")
+        first = reports.take_snapshot()
+        self.assertTrue(first.full)
+        self.assertEqual((first.total_customers, first.total_orders, first.total_revenue), (2, 2, Decimal("39.96")))
+
+        make_orders(1, "week2")
+        second = reports.take_snapshot()
+        self.assertFalse(second.full)
+        self.assertEqual((second.new_customers, second.new_orders, second.new_revenue), (1, 1, Decimal("19.98")))
+        self.assertEqual((second.total_orders, second.total_revenue), (3, Decimal("59.94")))
+
+        unchanged = reports.take_snapshot(full=False)
+        self.assertEqual((unchanged.new_orders, unchanged.total_orders), (0, 3))
+
+    def test_reconciliation_corrects_drift(self):
+        make_orders(2, "drift")
+        reports.take_snapshot()
+        order = Order.objects.first()
+        order.status = "completed"
+        order.save()
+        order.delete()
+        self.assertEqual(reports.take_snapshot(full=False).total_orders, 2)
+        reconciled = reports.take_snapshot()
+        self.assertTrue(reconciled.full)
+        self.assertEqual((reconciled.total_orders, reconciled.total_revenue), (1, Decimal("19.98")))
+
+    def test_snapshots_are_queryable(self):
+        make_orders(1, "gql")
+        reports.take_snapshot()
+        result = schema.execute(
+            "{ latestReportSnapshot { full totalOrders } reportSnapshots(first: 5) { edges { node { newOrders } } } }",
+            context_value=Context(),
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["latestReportSnapshot"], {"full": True, "totalOrders": 1})
+        self.assertEqual(result.data["reportSnapshots"]["edges"], [{"node": {"newOrders": 1}}])
+
+
+class RevenueByPeriodTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        customer = Customer.objects.create(first_name="Ada", last_name="Periods", email="periods@example.com")
+        self.now = timezone.now()
+        self.placed = [self.now - timedelta(days=days) for days in (95, 64, 63, 1, 0)]
+        for n, created_at in enumerate(self.placed):
+            order = Order.objects.create(
+                customer=customer, order_number=f"period-{n}", created_at=created_at,
+                status="completed" if n % 2 else "active",
+            )
+            OrderItem.objects.create(order=order, product_name="item", quantity=n + 1, price="10.00")
+
+    def test_buckets_and_live_grouping_agree(self):
+        for granularity in stats.GRANULARITIES:
+            for bounds in ({}, {'date_from': self.placed[1] + timedelta(minutes=1), 'date_to': self.placed[3]}):
+                with self.subTest(granularity=granularity, **bounds):
+                    bucketed = stats.revenue_by_period(granularity, **bounds)
+                    with self.settings(CRM_STATS_ROLLUP=False):
+                        self.assertEqual(bucketed, stats.revenue_by_period(granularity, **bounds))
+        everything = stats.revenue_by_period('month')
+        self.assertEqual(sum(p['orders'] for p in everything), 5)
+        self.assertEqual(sum(p['revenue'] for p in everything), Decimal("150.00"))
+        # Closed days come from one grouped bucket query; only today scans orders.
+        with self.assertNumQueries(2):
+            stats.revenue_by_period('week')
+
+    def test_graphql_field_filters_by_status(self):
+        result = schema.execute(
+            'query($from: DateTime) { revenueByPeriod(granularity: DAY, from: $from, status: "completed") '
+            '{ periodStart orders revenue } }',
+            variable_values={"from": (self.now - timedelta(days=70)).isoformat()},
+            context_value=Context(),
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["revenueByPeriod"], [
+            {"periodStart": timezone.localdate(self.placed[1]).isoformat(), "orders": 1, "revenue": 20.0},
+            {"periodStart": timezone.localdate(self.placed[3]).isoformat(), "orders": 1, "revenue": 40.0},
+        ])
+
+
+class SearchCustomersTests(TestCase):
+    def setUp(self):
+        for first_name, last_name, email, phone in (
+            ("John", "Doe", "jdoe@example.com", "+15550001111"),
+            ("Johanna", "Smith", "jo.smith@example.com", None),
+            ("Mary", "Johnson", "mary@example.org", "+15550002222"),
+            ("Zoë", "Åberg", "zoe@example.com", None),
+            ("Ann", "Lee", "maryann.lee@example.com", None),
+        ):
+            Customer.objects.create(first_name=first_name, last_name=last_name, email=email, phone_number=phone)
+
+    def names(self, query, first=10):
+        return [customer.last_name for customer in search.search(query, first)]
+
+    def test_prefix_matching_and_ranking(self):
+        self.assertEqual(self.names("jo do"), ["Doe"])
+        self.assertEqual(self.names("+1555000"), ["Doe", "Johnson"])
+        self.assertEqual(self.names("zoe aber"), ["Åberg"])
+        self.assertEqual(self.names("john"), ["Doe", "Johnson"])
+        # A name match ranks above an email match.
+        self.assertEqual(self.names("mary"), ["Johnson", "Lee"])
+        self.assertEqual(len(self.names("j", first=2)), 2)
+        self.assertEqual(self.names("  "), [])
+
+    def test_index_follows_bulk_writes(self):
+        Customer.objects.bulk_create([Customer(first_name="Grace", last_name="Hopper", email="grace@example.com")])
+        Customer.objects.filter(last_name="Doe").update(last_name="Dough")
+        Customer.objects.filter(last_name="Smith").guarded_delete()
+        self.assertEqual(self.names("grac"), ["Hopper"])
+        self.assertEqual(self.names("john do"), ["Dough"])
+        self.assertEqual(self.names("johanna"), [])
+        self.assertTrue(search.in_sync())
+        out = StringIO()
+        call_command("rebuild_customer_search", stdout=out)
+        call_command("rebuild_customer_search", check=True, stdout=out)
+        self.assertIn("Indexed 5 customers.", out.getvalue())
+
+    @override_settings(CRM_CUSTOMER_SEARCH_FTS=False)
+    def test_fallback_without_the_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.names("jo do"), ["Doe"])
+        # The filter and LIMIT run without the order statistics, which only load for the matches.
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("crm_order", queries[0]["sql"])
+        self.assertEqual(self.names("john"), ["Doe", "Johnson"])
+
+    def test_graphql_field(self):
+        result = schema.execute(
+            '{ searchCustomers(query: "mary", first: 1) { email orderCount } }', context_value=Context()
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["searchCustomers"], [{"email": "mary@example.org", "orderCount": 0}])
+
+
+class ExplainCrmQueriesTests(TransactionTestCase):
+    def index_names(self):
+        with connection.cursor() as cursor:
+            return {
+                name
+                for model in (Customer, Order, OrderItem, Product)
+                for name, info in connection.introspection.get_constraints(cursor, model._meta.db_table).items()
+                if info["index"]
+            }
+
+    def test_indexes_survive_the_comparison(self):
+        make_orders(3, "explain")
+        before = self.index_names()
+        self.assertTrue({index.name for index in Order._meta.indexes} <= before)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "plans.json")
+            call_command("explain_crm_queries", repeat=1, output=output, stdout=StringIO())
+            with open(output) as fh:
+                report = json.load(fh)
+        self.assertEqual(self.index_names(), before)
+        self.assertIn("customer_latest_order", report)
+        self.assertNotEqual(report["customer_latest_order"]["before"]["plan"], report["customer_latest_order"]["after"]["plan"])
+
+
+@override_settings(CRM_REMINDER_RATE=0, CRM_REMINDER_WORKERS=2)
+class OrderReminderTests(TestCase):
+    def setUp(self):
+        graphql_client.reset()
+        self.addCleanup(graphql_client.reset)
+
+    def test_pages_dedupe_by_email_and_skip_old_orders(self):
+        make_orders(5, "rem")
+        customer = Customer.objects.get(email="rem0@example.com")
+        Order.objects.create(customer=customer, order_number="rem-again")
+        Order.objects.create(
+            customer=Customer.objects.create(first_name="Old", last_name="Order", email="old@example.com"),
+            order_number="rem-old", created_at=timezone.now() - timedelta(days=8),
+        )
+        result = reminders.dispatch(page_size=2)
+        self.assertEqual((result.sent, result.skipped, result.failed), (5, 0, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [f"rem{n}@example.com" for n in range(5)])
+        self.assertEqual(OrderReminder.objects.get(email="rem0@example.com").order_number, "rem-again")
+
+    def test_rerun_only_sends_what_was_not_sent(self):
+        make_orders(3, "rerun")
+        with mock.patch.object(reminders.Dispatcher, "send", side_effect=[True, RuntimeError("smtp down"), True]), \
+                self.assertLogs("crm.reminders", "ERROR"):
+            first = reminders.dispatch()
+        self.assertEqual((first.sent, first.failed), (2, 1))
+        second = reminders.dispatch()
+        self.assertEqual((second.sent, second.skipped), (1, 2))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_rate_limiter_spaces_calls(self):
+        clock = mock.Mock(return_value=10.0)
+        sleeps = []
+        limiter = reminders.RateLimiter(4, clock=clock, sleep=sleeps.append)
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(sleeps, [0.25, 0.5])
+
+
+class AsyncViewTests(TransactionTestCase):
+    view = staticmethod(AsyncCrmGraphQLView.as_view())
+
+    def setUp(self):
+        cache.clear()
+
+    async def post(self, query, **headers):
+        request = AsyncRequestFactory().post(
+            "/graphql", {"query": query}, content_type="application/json", headers=headers
+        )
+        return await self.view(request)
+
+    async def test_nested_relations_resolve_in_the_orm_pool(self):
+        await sync_to_async(make_orders)(3, "async")
+        with self.settings(DEBUG=True, CRM_GRAPHQL_INSTRUMENTATION=True):
+            response = await self.post(
+                "{ orders { edges { node { orderNumber customer { email } items { productName } } } } }",
+                **{instrumentation.DEBUG_HEADER: "1"},
+            )
+        body = json.loads(response.content)
+        orders = [edge["node"] for edge in body["data"]["orders"]["edges"]]
+        self.assertEqual(len(orders), 3)
+        self.assertTrue(all(order["customer"]["email"] and len(order["items"]) == 2 for order in orders))
+        # SQL issued in pool threads is still attributed to its resolver.
+        report = body["extensions"]["instrumentation"]
+        self.assertEqual(report["resolvers"]["orders.edges.node.customer"]["queries"], 1)
+        self.assertEqual(report["queries"], 3)
+
+    async def test_model_properties_under_mutation_payloads_resolve_in_the_pool(self):
+        response = await self.post(
+            'mutation { createCustomer(input: {name: "Ada Async", email: "ada.async@example.com"}) '
+            "{ customer { email isActive orderCount } } "
+            'bulkCreateCustomers(input: [{name: "Bo Async", email: "bo.async@example.com"}]) '
+            "{ customers { email isActive hasOrders } } }"
+        )
+        body = json.loads(response.content)
+        self.assertNotIn("errors", body)
+        self.assertEqual(
+            body["data"]["createCustomer"]["customer"],
+            {"email": "ada.async@example.com", "isActive": False, "orderCount": 0},
+        )
+        self.assertEqual(
+            body["data"]["bulkCreateCustomers"]["customers"],
+            [{"email": "bo.async@example.com", "isActive": False, "hasOrders": False}],
+        )
+
+    async def test_loaded_properties_resolve_inline(self):
+        await sync_to_async(make_orders)(3, "inline")
+        with mock.patch("crm.loaders._in_pool", wraps=loaders._in_pool) as pooled:
+            response = await self.post("{ customers { edges { node { email isActive orderCount hasOrders } } } }")
+        nodes = [edge["node"] for edge in json.loads(response.content)["data"]["customers"]["edges"]]
+        self.assertEqual([node["orderCount"] for node in nodes], [1, 1, 1])
+        # Only the root field; the with_stats() values are already on the customers.
+        self.assertEqual(pooled.call_count, 1)
+
+    async def test_pool_threads_keep_their_connection_for_the_request(self):
+        # More pooled resolvers than pool threads (CRM_GRAPHQL_ORM_THREADS).
+        await sync_to_async(make_orders)(12, "conn")
+        wrapper = type(connections["default"])
+        with mock.patch("crm.loaders._in_pool", wraps=loaders._in_pool) as pooled, \
+                mock.patch("crm.loaders.close_old_connections") as claimed, \
+                mock.patch.object(wrapper, "close_if_unusable_or_obsolete", autospec=True) as released:
+            response = await self.post("{ orders { edges { node { orderNumber customer { email isActive } } } } }")
+        self.assertEqual(len(json.loads(response.content)["data"]["orders"]["edges"]), 12)
+        # One claim per pool thread that served the request, not one per resolver,
+        # and one release per connection those threads opened once the request is done.
+        self.assertGreater(pooled.call_count, claimed.call_count)
+        self.assertGreater(released.call_count, 0)
+        self.assertLessEqual(released.call_count, claimed.call_count)
+
+    async def test_root_fields_run_concurrently(self):
+        def slow_totals():
+            time.sleep(0.2)
+            return {"total_customers": 1, "total_orders": 2, "total_revenue": 3}
+
+        with mock.patch("crm.schema.stats.totals", slow_totals):
+            started = time.monotonic()
+            response = await self.post("{ totalCustomers totalOrders totalRevenue }")
+            elapsed = time.monotonic() - started
+        self.assertEqual(
+            json.loads(response.content)["data"], {"totalCustomers": 1, "totalOrders": 2, "totalRevenue": 3.0}
+        )
+        self.assertLess(elapsed, 0.5)
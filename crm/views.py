@@ -1,3 +1,380 @@
-from django.shortcuts import render
+import inspect
+import json
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.http.response import HttpResponseBadRequest
+from django.views.generic import View
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, parse, validate_schema
+from graphql.validation import validate
+
+from . import cost, documents, instrumentation, loaders
+
+
+def max_batch_size():
+    return getattr(settings, 'CRM_GRAPHQL_MAX_BATCH_SIZE', 20)
+
+
+def with_extensions(result, extensions):
+    """Merge extensions into an ExecutionResult, or into the one an async execution will produce."""
+    if inspect.isawaitable(result):
+        async def finish():
+            try:
+                return with_extensions(await result, extensions)
+            except Exception as e:
+                return ExecutionResult(errors=[e])
+        return finish()
+    result.extensions = {**(result.extensions or {}), **extensions} or None
+    return result
+
+
+class CrmGraphQLView(GraphQLView):
+    """
+    GraphQLView with a validated-document cache, persisted queries
+    (crm.documents), cost and depth admission control (crm.cost) and optional
+    per-request instrumentation (crm.instrumentation).
+
+    The computed cost is returned in the response ``extensions``. Requests
+    carrying the X-GraphQL-Debug header also get the instrumentation report
+    there (only with DEBUG on or for staff users, since it contains SQL); all
+    other instrumented requests are logged.
+
+    A JSON array body is a batch: its operations run in order within the one
+    request, sharing its database connection and loaders (except across a
+    mutation), and the response is an array in the same order. Each entry
+    carries its own ``id`` and ``status``, so one failing operation does not
+    fail the others; the batch as a whole answers 200. Batches are capped at
+    CRM_GRAPHQL_MAX_BATCH_SIZE operations.
+    """
+
+    def parse_body(self, request):
+        if self.get_content_type(request) != "application/json":
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+        # Each request gets its own view instance, so this only affects this request.
+        self.batch = isinstance(data, list)
+        if self.batch:
+            if not data:
+                raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+            if len(data) > max_batch_size():
+                raise HttpError(HttpResponseBadRequest(
+                    f"Batch of {len(data)} operations exceeds the maximum of {max_batch_size()}."
+                ))
+            if not all(isinstance(entry, dict) for entry in data):
+                raise HttpError(HttpResponseBadRequest("Every batch entry must be a JSON object."))
+        elif not isinstance(data, dict):
+            raise HttpError(HttpResponseBadRequest("The received data is not a valid JSON query."))
+        return data
+
+    def batch_error(self, request, entry, error):
+        """The response entry for a batched operation that was rejected before execution."""
+        response = {"errors": [self.format_error(error)], "id": entry.get("id"), "status": error.response.status_code}
+        return self.json_encode(request, response), 200
+
+    def wants_debug(self, request):
+        if not request.headers.get(instrumentation.DEBUG_HEADER):
+            return False
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or bool(user and user.is_staff)
+
+    def client_key(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if getattr(request, 'crm_instrumentation', None) is None:
+            return middleware
+        return [*(middleware or []), instrumentation.ResolverInstrumentation()]
+
+    def get_document(self, query, sha256):
+        """Parse and validate a query, or return the cached DocumentNode; (document, errors)."""
+        schema = self.schema.graphql_schema
+        key = (id(schema), sha256)
+        document = documents.documents.get(key)
+        if document is not None:
+            return document, None
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        errors = validate(schema, document, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        if errors:
+            return None, errors
+        documents.documents.put(key, document)
+        return document, None
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        if not instrumentation.enabled() or (not query and show_graphiql):
+            return self.execute_document(request, data, query, variables, operation_name, show_graphiql)
+        recorder = request.crm_instrumentation = instrumentation.Recorder()
+        with instrumentation.recording(recorder):
+            return self.execute_document(request, data, query, variables, operation_name, show_graphiql)
+
+    def execute_document(self, request, data, query, variables, operation_name, show_graphiql=False):
+        # GraphQLView.execute_graphql_request, with persisted query lookup and
+        # the document cache in place of parse() and validate().
+        if not query and show_graphiql:
+            return None
+        try:
+            query, sha256 = documents.resolve_query(query, documents.extensions_of(request, data))
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+        if not query:
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, errors = self.get_document(query, sha256)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    f"Can only perform a {operation_ast.operation.value} operation from a POST request.",
+                )
+            )
+
+        self.share_loaders(request, operation_ast)
+        extensions = {}
+        if operation_ast is not None:
+            try:
+                extensions['cost'] = cost.admit(
+                    schema, operation_ast, document, variables, self.client_key(request)
+                )
+            except cost.QueryCostError as e:
+                return ExecutionResult(errors=[e])
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if self.atomic_mutation(operation_ast):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                result = execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        return with_extensions(result, extensions)
+
+    def share_loaders(self, request, operation_ast):
+        # Operations of a batch reuse the loaders on the request, but not across a
+        # mutation: it may change the rows they have cached.
+        mutation = operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+        if mutation or getattr(request, 'crm_after_mutation', False):
+            request.crm_loaders = None
+        request.crm_after_mutation = mutation
+
+    def atomic_mutation(self, operation_ast):
+        return (
+            operation_ast is not None
+            and operation_ast.operation == OperationType.MUTATION
+            and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+            )
+        )
+
+    def get_response(self, request, data, show_graphiql=False):
+        # GraphQLView.get_response, plus the result's extensions and the
+        # instrumentation report.
+        if self.batch:
+            try:
+                return self._get_response(request, data)
+            except HttpError as e:
+                return self.batch_error(request, data, e)
+        return self._get_response(request, data, show_graphiql)
+
+    def _get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, operation_name, id, show_graphiql)
+
+    def build_response(self, request, execution_result, operation_name, id, show_graphiql=False):
+        recorder = getattr(request, 'crm_instrumentation', None)
+        request.crm_instrumentation = None
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        if not execution_result:
+            return None, 200
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(not getattr(e, "path", None) for e in execution_result.errors):
+            codes = {(getattr(e, "extensions", None) or {}).get("code") for e in execution_result.errors}
+            status_code = 429 if "RATE_LIMITED" in codes else 400
+        else:
+            response["data"] = execution_result.data
+
+        extensions = dict(execution_result.extensions or {})
+        if recorder is not None:
+            if self.wants_debug(request):
+                extensions["instrumentation"] = recorder.report()
+            else:
+                recorder.log(operation_name)
+        if extensions:
+            response["extensions"] = extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+            status_code = 200
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+
+class ResolversInThreads:
+    """
+    Graphene middleware for the async view: runs the synchronous resolvers
+    that may use the ORM in the ORM thread pool, so independent root fields
+    of a query execute concurrently and no resolver touches the database on
+    the event loop.
+
+    That is every root field (queries and mutations) and every field of a
+    model instance that may query. Column values already loaded on the
+    instance, and properties whose with_stats() annotation or prefetch is there
+    (the type's ``loaded_from``), resolve inline; the rest, such as relations or
+    Customer.is_active on a customer created by a mutation, run in the pool.
+    Other parents (connections, edges, payloads) hold plain values and resolve
+    inline.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if info.path.prev is None or self.may_query(root, info):
+            return self.in_thread(next, root, info, **args)
+        return next(root, info, **args)
+
+    @staticmethod
+    def may_query(root, info):
+        if not isinstance(root, models.Model):
+            return False
+        name = to_snake_case(info.field_name)
+        if name in root.__dict__:
+            return False
+        attribute = getattr(info.parent_type.graphene_type, "loaded_from", {}).get(name)
+        return attribute is None or attribute not in root.__dict__
+
+    async def in_thread(self, next, root, info, **args):
+        result = await loaders.run(next, root, info, **args)
+        if inspect.isawaitable(result):
+            # An async resolver: only creating the coroutine happened in the thread.
+            result = await result
+        return result
+
+
+class AsyncCrmGraphQLView(CrmGraphQLView):
+    """
+    CrmGraphQLView for ASGI. One event loop serves many concurrent requests;
+    blocking ORM work runs in the bounded thread pool of crm.loaders.run.
+
+    Mutation fields still run one after another, each in its own thread with
+    its own transactions; ATOMIC_MUTATIONS, which needs the whole operation on
+    one connection, is not applied here.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        return await self.handle(request)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.handle(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        # Route to the async handlers rather than GraphQLView's synchronous dispatch.
+        return View.dispatch(self, request, *args, **kwargs)
+
+    def get_middleware(self, request):
+        # Innermost, so instrumentation wrapped around it times the threaded call.
+        return [ResolversInThreads(), *(super().get_middleware(request) or [])]
+
+    def atomic_mutation(self, operation_ast):
+        return False
+
+    async def handle(self, request):
+        if hasattr(request, 'auser'):
+            # Resolve the lazy user now; loading it later would query on the event loop.
+            request.user = await request.auser()
+        async with loaders.request_scope():
+            return await self.handle_in_scope(request)
+
+    async def handle_in_scope(self, request):
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(GraphQLView.dispatch)(self, request)
+            if self.batch:
+                responses = [await self.get_batch_response_async(request, entry) for entry in data]
+                result = "[{}]".format(",".join(response[0] for response in responses))
+                status_code = 200
+            else:
+                result, status_code = await self.get_response_async(request, data)
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_batch_response_async(self, request, entry):
+        try:
+            return await self.get_response_async(request, entry)
+        except HttpError as e:
+            return self.batch_error(request, entry, e)
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        if instrumentation.enabled() and query is not None:
+            recorder = request.crm_instrumentation = instrumentation.Recorder()
+            with instrumentation.recording(recorder):
+                execution_result = await self.execute_async(request, data, query, variables, operation_name)
+        else:
+            execution_result = await self.execute_async(request, data, query, variables, operation_name)
+        return self.build_response(request, execution_result, operation_name, id)
+
+    async def execute_async(self, request, data, query, variables, operation_name):
+        result = self.execute_document(request, data, query, variables, operation_name)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
@@ -1,10 +1,11 @@
 import graphene
+from alx_backend_graphql_crm.schema import Query as CoreQuery, Mutation as CoreMutation
 from crm.schema import Query as CrmQuery, Mutation as CrmMutation
 
-class Query(CrmQuery, graphene.ObjectType):
+class Query(CrmQuery, CoreQuery, graphene.ObjectType):
     pass
 
-class Mutation(CrmMutation, graphene.ObjectType):
+class Mutation(CrmMutation, CoreMutation, graphene.ObjectType):
     pass
 
 schema = graphene.Schema(query=Query, mutation=Mutation)